@@ -0,0 +1,212 @@
+import numpy as np
+from models import hypothesis_space
+
+WORD_SIZE = 64
+
+# number of hypotheses unpacked at a time by weighted sums
+BLOCK_SIZE = 4096
+
+# number of set bits in every possible byte, used to popcount packed words
+BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)],
+                         dtype=np.int64)
+
+
+def n_words(n_features):
+    """Calculates the number of 64-bit words needed to store n_features bits"""
+    return (n_features + WORD_SIZE - 1) // WORD_SIZE
+
+
+def low_bits(k):
+    """Creates words with the lowest k bits set, for 0 <= k <= 64"""
+    k = np.asarray(k, dtype=np.uint64)
+    full = k == WORD_SIZE
+
+    # shifting by the word size is undefined, so fill full words separately
+    words = np.left_shift(np.uint64(1), np.where(full, np.uint64(0), k)) - \
+        np.uint64(1)
+    words[full] = ~np.uint64(0)
+    return words
+
+
+def pack(hyps):
+    """Packs a 0/1 matrix of hypotheses into rows of uint64 words, where
+    feature j is stored in bit j % 64 of word j // 64"""
+    hyps = np.atleast_2d(np.asarray(hyps, dtype=bool))
+    n_hyp, n_features = hyps.shape
+
+    bits = np.zeros((n_hyp, n_words(n_features) * WORD_SIZE), dtype=np.uint64)
+    bits[:, :n_features] = hyps
+    bits = bits.reshape(n_hyp, -1, WORD_SIZE)
+
+    weights = np.left_shift(np.uint64(1),
+                            np.arange(WORD_SIZE, dtype=np.uint64))
+    return np.bitwise_or.reduce(bits * weights, axis=2)
+
+
+def unpack(words, n_features):
+    """Unpacks rows of uint64 words back into a 0/1 matrix of hypotheses"""
+    words = np.asarray(words, dtype=np.uint64)
+    shifts = np.arange(WORD_SIZE, dtype=np.uint64)
+    bits = np.right_shift(words[..., None], shifts) & np.uint64(1)
+    bits = bits.reshape(words.shape[:-1] + (-1,))
+    return bits[..., :n_features].astype(int)
+
+
+def pack_intervals(starts, ends, n_features):
+    """Packs hypotheses that are a single run of ones over the features
+    [start, end) without materializing the dense matrix"""
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    offsets = np.arange(n_words(n_features)) * WORD_SIZE
+
+    # position of the run inside each word, clipped to the word
+    lo = np.clip(starts[:, None] - offsets, 0, WORD_SIZE)
+    hi = np.clip(ends[:, None] - offsets, 0, WORD_SIZE)
+
+    return low_bits(hi) & ~low_bits(lo)
+
+
+def popcount(words):
+    """Counts the number of set bits in each row of packed words"""
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return np.sum(BYTE_POPCOUNT[words.view(np.uint8)], axis=-1)
+
+
+class BitsetHypSpace:
+    def __init__(self, words, n_features):
+        self.words = np.asarray(words, dtype=np.uint64)
+        self.n_features = n_features
+        self.n_hyp = len(self.words)
+        self.shape = (self.n_hyp, self.n_features)
+
+        assert self.words.shape == (self.n_hyp, n_words(n_features))
+
+    @classmethod
+    def from_hyps(cls, hyps):
+        """Creates a bitset hypothesis space from a dense 0/1 matrix"""
+        hyps = np.atleast_2d(hyps)
+        return cls(pack(hyps), hyps.shape[1])
+
+    @classmethod
+    def from_intervals(cls, starts, ends, n_features):
+        """Creates a bitset hypothesis space from runs of ones"""
+        return cls(pack_intervals(starts, ends, n_features), n_features)
+
+    def __len__(self):
+        return self.n_hyp
+
+    def index(self, hyp):
+        """Finds the row of a hypothesis by comparing packed words"""
+        matches = np.flatnonzero(np.all(self.words == pack(hyp)[0], axis=1))
+        if len(matches) == 0:
+            raise ValueError("hypothesis is not in the hypothesis space")
+
+        return matches[0]
+
+    def __iter__(self):
+        for words in self.words:
+            yield unpack(words, self.n_features)
+
+    def __getitem__(self, key):
+        """Returns dense rows, or labels of a feature when indexed as
+        hyp_space[rows, feature]"""
+        if isinstance(key, tuple):
+            rows, feature = key
+            return self.bits(self.words[rows], feature)
+        return unpack(self.words[key], self.n_features)
+
+    def __array__(self, dtype=None, copy=None):
+        hyps = unpack(self.words, self.n_features)
+        return hyps if dtype is None else hyps.astype(dtype)
+
+    def bits(self, words, feature):
+        """Extracts the bit of a feature from packed words"""
+        word, bit = divmod(int(feature), WORD_SIZE)
+        return (np.right_shift(words[..., word], np.uint64(bit)) &
+                np.uint64(1)).astype(int)
+
+    def column(self, feature):
+        """Calculates the label every hypothesis assigns to a feature"""
+        return self.bits(self.words, feature)
+
+    def word_bits(self, words, word, label=1):
+        """Unpacks one word of every row into 0/1 columns of its features,
+        which are one where the hypothesis gives the feature this label"""
+        shifts = np.arange(WORD_SIZE, dtype=np.uint64)
+        bits = np.right_shift(words[:, word, None], shifts) & np.uint64(1)
+        bits = bits[:, :self.n_features - word * WORD_SIZE]
+        return (bits == label).astype(float)
+
+    def weighted_column_sums(self, weights, label=1, rows=None):
+        """Calculates sum_h weights[h] over the hypotheses giving each
+        feature this label, unpacking one block of words at a time. If rows
+        is given, weights are over that subset of hypotheses"""
+        words = self.words if rows is None else self.words[rows]
+        sums = np.zeros(self.n_features)
+        for start in range(0, len(words), BLOCK_SIZE):
+            block = slice(start, start + BLOCK_SIZE)
+            for word in range(words.shape[1]):
+                sums[word * WORD_SIZE:(word + 1) * WORD_SIZE] += np.dot(
+                    weights[block], self.word_bits(words[block], word, label))
+
+        return sums
+
+    def weighted_row_sums(self, values, label=1, rows=None):
+        """Calculates sum_x values[x] over the features each hypothesis gives
+        this label, unpacking one block of words at a time. If rows is
+        given, only those hypotheses are returned"""
+        words = self.words if rows is None else self.words[rows]
+        sums = np.zeros(len(words))
+        for start in range(0, len(words), BLOCK_SIZE):
+            block = slice(start, start + BLOCK_SIZE)
+            for word in range(words.shape[1]):
+                sums[block] += np.dot(
+                    self.word_bits(words[block], word, label),
+                    values[word * WORD_SIZE:(word + 1) * WORD_SIZE])
+
+        return sums
+
+    def data_masks(self, features, labels):
+        """Packs observed data into masks of positive and negative features"""
+        features = np.asarray(features, dtype=int)
+        labels = np.asarray(labels, dtype=int)
+
+        positive = np.zeros(self.n_features, dtype=bool)
+        negative = np.zeros(self.n_features, dtype=bool)
+        positive[features[labels == 1]] = True
+        negative[features[labels == 0]] = True
+
+        return pack(positive)[0], pack(negative)[0]
+
+    def mismatches(self, features, labels, rows=None):
+        """Counts the observations each hypothesis labels incorrectly"""
+        words = self.words if rows is None else self.words[rows]
+        positive, negative = self.data_masks(features, labels)
+        return popcount(~words & positive) + popcount(words & negative)
+
+    def consistent(self, features, labels, rows=None):
+        """Calculates which hypotheses are consistent with the observations"""
+        return self.mismatches(features, labels, rows) == 0
+
+    def version_space_size(self, features, labels):
+        """Counts the hypotheses consistent with the observations"""
+        return np.count_nonzero(self.consistent(features, labels))
+
+    def mask_posterior(self, posterior, features, labels, rows=None):
+        """Zeros out inconsistent hypotheses and renormalizes the posterior.
+        If rows is given, the posterior is over that subset of hypotheses"""
+        posterior = posterior * self.consistent(features, labels, rows)
+        if np.sum(posterior) != 0:
+            return posterior / np.sum(posterior)
+        else:
+            return posterior
+
+
+def create_bitset_hyp_space(hyp_space_type, n_features):
+    """Creates a packed hypothesis space of lines or boundaries"""
+    implicit_hyp_space = hypothesis_space.create_implicit_hyp_space(
+        hyp_space_type, n_features)
+    starts, ends = implicit_hyp_space.intervals(np.arange(len(
+        implicit_hyp_space)))
+
+    return BitsetHypSpace.from_intervals(starts, ends, n_features)
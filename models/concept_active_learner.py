@@ -3,37 +3,38 @@ import models.utils as utils
 
 
 class ConceptActiveLearner:
-    def __init__(self, n_features=3, hyp_space_type="boundary",
-                 sampling="max", true_hyp=None):
-        assert(n_features > 0)
-
+    def __init__(self, n_features=None, hyp_space_type=None,
+                 sampling="max", true_hyp=None, backend="dense",
+                 active_set=False, hyp_space=None):
         self.d = []  # observed data points
         self.n_obs = 0  # number of observed data points
         self.n_labels = 2  # number of possible y values
-        self.n_features = n_features
-
-        if hyp_space_type == "boundary":
-            self.hyp_space = utils.create_boundary_hyp_space(self.n_features)
-        elif hyp_space_type == "line":
-            self.hyp_space = utils.create_line_hyp_space(self.n_features)
+        # use a shared hypothesis space, or look one up by type
+        self.hyp_space = utils.resolve_hyp_space(n_features, hyp_space_type,
+                                                 backend, hyp_space)
+        self.n_features = self.hyp_space.n_features
 
         self.n_hyp = len(self.hyp_space)
         self.prior = np.array([1 / self.n_hyp
                                for _ in range(self.n_hyp)])
         self.posterior = self.prior
 
+        # drop eliminated hypotheses from the posterior as the run
+        # progresses, keeping a map from active rows back to hypothesis ids
+        self.active_set = active_set
+        self.active_hyps = np.arange(self.n_hyp)
+        self.n_active = self.n_hyp
+
         if true_hyp is not None:
             self.true_hyp = true_hyp
-            self.true_hyp_idx = \
-                np.where([np.all(true_hyp == hyp)
-                          for hyp in self.hyp_space])[0]
+            self.true_hyp_idx = self.hyp_space.index(true_hyp)
         else:
             self.true_hyp_idx = np.random.randint(self.n_hyp)
             self.true_hyp = self.hyp_space[self.true_hyp_idx]
 
         self.posterior_true_hyp = np.ones(self.n_features + 1)
         self.posterior_true_hyp[0] = 1 / self.n_hyp
-        self.first_feature_prob = np.zeros(n_features)
+        self.first_feature_prob = np.zeros(self.n_features)
         self.sampling = sampling
 
     def likelihood(self, x, y):
@@ -42,26 +43,37 @@ class ConceptActiveLearner:
         # assert np.logical_or(np.isclose(y, 0.0), np.isclose(y, 1.0))
         # assert y == 0.0 or y == 1.0
 
-        lik = np.zeros(len(self.hyp_space))
-        for i, hyp in enumerate(self.hyp_space):
-            if hyp[x] == y:
-                lik[i] = 1
-            else:
-                lik[i] = 0
+        lik = (self.hyp_space[self.active_hyps, x] == y).astype(float)
         return lik
 
+    def active_index(self, hyp_idx):
+        """Finds the row of a hypothesis in the active set"""
+        return np.searchsorted(self.active_hyps, hyp_idx)
+
+    def active_rows(self):
+        """Returns the active hypothesis ids, or None if all are active"""
+        if self.n_active == self.n_hyp:
+            return None
+
+        return self.active_hyps
+
+    def compact(self, keep):
+        """Restricts the prior and posterior to the hypotheses in keep"""
+        self.active_hyps = self.active_hyps[keep]
+        self.n_active = len(self.active_hyps)
+
+        self.prior = self.prior[keep]
+        self.posterior = self.posterior[keep]
+
     def observe(self, x, y):
         """Calculate the posterior based on observing x"""
 
         # assert np.logical_or(np.isclose(y, 0.0), np.isclose(y, 1.0))
         # assert y == 0 or y == 1
 
-        lik = self.likelihood(x, y)
-        posterior = np.array(self.posterior) * np.array(lik)
-        if np.sum(posterior) != 0:
-            return posterior / np.sum(posterior)
-        else:
-            return posterior
+        return self.hyp_space.mask_posterior(
+            np.asarray(self.posterior, dtype=float), [x], [y],
+            self.active_rows())
 
     def update(self, x, y):
         """Updates the model based on observing x using Bayesian inference"""
@@ -72,6 +84,10 @@ class ConceptActiveLearner:
         # lik = self.likelihood(x, y)
         self.posterior = self.observe(x, y)
 
+        # drop hypotheses eliminated by the observation
+        if self.active_set:
+            self.compact(self.posterior > 0)
+
     def entropy(self, p):
         """Calculate the entropy of a random variable"""
 
@@ -99,11 +115,43 @@ class ConceptActiveLearner:
             eig_vec[i] = self.information_gain(x, y)
 
             # calculate posterior prob consistent with this observation
-            eig_idx = np.where(self.hyp_space[:, x] == y)
-            eig_weights[i] = np.sum(self.posterior[eig_idx])
+            if self.n_active == self.n_hyp:
+                eig_idx = self.hyp_space.label_rows(x, y)
+                eig_weights[i] = np.sum(self.posterior[eig_idx])
+            else:
+                eig_weights[i] = np.dot(self.posterior,
+                                        self.likelihood(x, y))
 
         return np.dot(eig_vec, eig_weights)
 
+    def batch_expected_information_gain(self):
+        """Calculate the expected information gain of every feature at once,
+        in linear time for boundary hypothesis spaces"""
+
+        # p log p for each hypothesis, ignoring zero probability hypotheses
+        posterior = np.asarray(self.posterior, dtype=float)
+        plogp = posterior * np.log(posterior,
+                                   out=np.zeros_like(posterior),
+                                   where=posterior > 0)
+        entropy_prior = -np.sum(plogp)
+
+        # posterior prob and sum of p log p consistent with each outcome
+        rows = self.active_rows()
+        weights = np.stack([self.hyp_space.weighted_column_sums(
+            posterior, y, rows) for y in range(self.n_labels)])
+        weighted_plogp = np.stack([self.hyp_space.weighted_column_sums(
+            plogp, y, rows) for y in range(self.n_labels)])
+
+        # entropy of the posterior after observing y, weighted by p(y|x),
+        # simplifies to w_y log w_y - sum_{h consistent with y} p log p
+        log_weights = np.log(weights, out=np.zeros_like(weights),
+                             where=weights > 0)
+        weighted_entropy_post = np.sum(
+            weights * log_weights - weighted_plogp, axis=0)
+
+        return np.sum(weights, axis=0) * entropy_prior - \
+            weighted_entropy_post
+
     def run(self, n_steps=None):
         """Runs the active learner until the true hypothesis is discovered"""
 
@@ -115,19 +163,18 @@ class ConceptActiveLearner:
 
         # while np.nonzero(self.posterior)[0].shape[0] > 1:
         while np.count_nonzero(self.posterior) > 1 and n_steps > 0:
-            eig = np.zeros_like(queries, dtype=np.float)
-            for i, query in enumerate(queries):
-                eig[i] = self.expected_information_gain(query)
+            eig = self.batch_expected_information_gain()
 
             # save prob of selecting features
             if self.n_obs == 0:
                 self.first_feature_prob = eig / np.sum(eig)
 
             query = -1
-            # select query with maximum expected information gain
+            # select query with maximum expected information gain, treating
+            # gains that only differ by rounding error as ties
             if self.sampling == "max":
                 query = queries[np.random.choice(
-                    np.where(eig == np.amax(eig))[0])]
+                    np.where(np.isclose(eig, np.amax(eig)))[0])]
             else:
                 # sample proportionally
                 query = np.random.choice(queries,
@@ -143,7 +190,7 @@ class ConceptActiveLearner:
 
             # save current posterior of true hypothesis
             self.posterior_true_hyp[self.n_obs] = \
-                self.posterior[self.true_hyp_idx]
+                self.posterior[self.active_index(self.true_hyp_idx)]
 
         return self.n_obs, self.posterior_true_hyp, self.first_feature_prob
 
@@ -1,34 +1,40 @@
 import numpy as np
 import models.utils as utils
+from models.version_space import VersionSpace
 
 
 class ConceptSelfTeacher:
-    def __init__(self, n_features=3, hyp_space_type="boundary",
-                 sampling="max", true_hyp=None):
-        self.n_features = n_features
+    def __init__(self, n_features=None, hyp_space_type=None,
+                 sampling="max", true_hyp=None, backend="dense",
+                 active_set=False, hyp_space=None):
+        # use a shared hypothesis space, or look one up by type
+        self.hyp_space = utils.resolve_hyp_space(n_features, hyp_space_type,
+                                                 backend, hyp_space)
+        self.n_features = self.hyp_space.n_features
         self.n_labels = 2
         self.observed_features = np.array([])
         self.observed_labels = np.array([])
         self.n_obs = 0
         self.features = np.arange(self.n_features)
         self.labels = np.arange(self.n_labels)
-        if hyp_space_type == "boundary":
-            self.hyp_space = utils.create_boundary_hyp_space(self.n_features)
-        elif hyp_space_type == "line":
-            self.hyp_space = utils.create_line_hyp_space(self.n_features)
         self.n_hyp = len(self.hyp_space)
-        self.learner_prior = (1 / self.n_hyp) * \
-            np.ones((self.n_hyp, self.n_features, self.n_labels))
-        self.self_teaching_posterior = np.zeros(
-            (self.n_hyp, self.n_features, self.n_labels))
+        self.learner_prior = np.broadcast_to(
+            1 / self.n_hyp, (self.n_hyp, self.n_features, self.n_labels))
+        self.self_teaching_posterior = np.broadcast_to(
+            0.0, (self.n_hyp, self.n_features, self.n_labels))
         self.learner_posterior = self.learner_prior
         self.sampling = sampling
 
+        # drop eliminated hypotheses from the hypothesis axis as the run
+        # progresses, keeping a map from active rows back to hypothesis ids
+        self.active_set = active_set
+        self.active_hyps = np.arange(self.n_hyp)
+        self.n_active = self.n_hyp
+        self.lik = None
+
         if true_hyp is not None:
             self.true_hyp = true_hyp
-            self.true_hyp_idx = \
-                np.where([np.all(true_hyp == hyp)
-                          for hyp in self.hyp_space])[0]
+            self.true_hyp_idx = self.hyp_space.index(true_hyp)
         else:
             self.true_hyp_idx = np.random.randint(self.n_hyp)
             self.true_hyp = self.hyp_space[self.true_hyp_idx]
@@ -38,19 +44,34 @@ class ConceptSelfTeacher:
         self.first_feature_prob = np.zeros(self.n_features)
 
     def likelihood(self):
-        """Calculates the likelihood of observing all possible pairs of data points"""
-        # returns a 66 x 11 x 2 matrix
+        """Calculates the likelihood of observing all possible pairs of data
+        points, which is computed once per hypothesis space"""
+        if self.lik is None:
+            self.lik = self.hyp_space.likelihood()
+            if self.n_active != self.n_hyp:
+                self.lik = self.lik[self.active_hyps]
+
+        return self.lik
+
+    def active_index(self, hyp_idx):
+        """Finds the row of a hypothesis in the active set"""
+        return np.searchsorted(self.active_hyps, hyp_idx)
+
+    def active_rows(self):
+        """Returns the active hypothesis ids, or None if all are active"""
+        if self.n_active == self.n_hyp:
+            return None
 
-        lik = np.ones((self.n_hyp, self.n_features, self.n_labels))
+        return self.active_hyps
 
-        for i, hyp in enumerate(self.hyp_space):
-            for j, feature in enumerate(self.features):
-                for k, label in enumerate(self.labels):
-                    if hyp[feature] == label:
-                        lik[i, j, k] = 1
-                    else:
-                        lik[i, j, k] = 0
-        return lik
+    def compact(self, keep):
+        """Restricts all tensors over hypotheses to the rows in keep"""
+        self.active_hyps = self.active_hyps[keep]
+        self.n_active = len(self.active_hyps)
+        self.lik = None
+
+        self.learner_prior = self.learner_prior[keep]
+        self.learner_posterior = self.learner_posterior[keep]
 
     def update_learner_posterior(self):
         """Calculates the unnormalized posterior across all
@@ -68,8 +89,9 @@ class ConceptSelfTeacher:
         denom = np.sum(self.learner_posterior, axis=0)
 
         # normalize across each hypothesis
-        self.learner_posterior = np.divide(self.learner_posterior,
-                                           denom, where=denom != 0)
+        self.learner_posterior = np.divide(
+            self.learner_posterior, denom,
+            out=np.zeros_like(self.learner_posterior), where=denom != 0)
 
         # set learner posterior to zero where denom = 0
         # print(np.isclose(denom, 0.0))
@@ -80,58 +102,81 @@ class ConceptSelfTeacher:
         to actively select using the teaching equations"""
 
         # use same code as teacher.py to calculate teaching posterior
-        # uniform joint over data, which is broadcasted into correct shape
-        prob_joint_data = (1 / (self.n_features * self.n_labels)) * \
-            np.ones((self.n_hyp, self.n_features, self.n_labels))  # p(x, y)
+        # uniform joint over data, which is broadcast against hypotheses
+        prob_joint_data = 1 / (self.n_features * self.n_labels)  # p(x, y)
 
         # multiply with posterior to get overall joint
         # p(h, x, y) = p(h|, x, y) * p(x, y)
         learner_posterior = self.learner_posterior
         prob_joint = learner_posterior * prob_joint_data
 
-        # marginalize over y, i.e. p(h, x), and broadcast result
+        # marginalize over y, i.e. p(h, x)
         prob_joint_hyp_features = np.sum(prob_joint, axis=2)
-        prob_joint_hyp_features = np.repeat(
-            prob_joint_hyp_features, self.n_labels).reshape(
-                self.n_hyp, self.n_features, self.n_labels)
 
         # divide by prior over hypotheses to get conditional prob
         # p(x|h) = p(x, h)/p(h)
         # prob_conditional_features = prob_joint_hyp_features / self.learner_prior
 
         # marginalize over x, i.e. p(h) = \sum_x p(h, x)
-        denom = np.repeat(np.sum(prob_joint_hyp_features, axis=1), self.n_features).reshape(
-            self.n_hyp, self.n_features, self.n_labels)
+        denom = np.sum(prob_joint_hyp_features, axis=1, keepdims=True)
 
-        prob_conditional_features = np.divide(prob_joint_hyp_features,
-                                              denom, where=denom != 0)
+        prob_conditional_features = np.divide(
+            prob_joint_hyp_features, denom,
+            out=np.zeros_like(prob_joint_hyp_features), where=denom != 0)
         prob_conditional_features = np.nan_to_num(prob_conditional_features)
 
-        # calculate equation for self-teaching
+        # calculate equation for self-teaching, broadcasting p(x|h) over
+        # labels
         # p(x|D) = \sum_h p(x|h) * p(h|D)
-        self_teaching_posterior = np.sum(prob_conditional_features * self.learner_prior,
-                                         axis=(0, 2))
+        self_teaching_posterior = np.sum(
+            prob_conditional_features[:, :, None] * self.learner_prior,
+            axis=(0, 2))
 
         # normalize
         self_teaching_posterior = self_teaching_posterior / \
             np.sum(self_teaching_posterior)
 
-        # braodcast self teaching posterior to the right shape, and transpose
-        self_teaching_posterior = np.broadcast_to(self_teaching_posterior,
-                                                  (self.n_hyp,
-                                                   self.n_labels,
-                                                   self.n_features))
+        # broadcast self teaching posterior to the right shape as a view
+        self.self_teaching_posterior = np.broadcast_to(
+            self_teaching_posterior[None, :, None],
+            (self.n_active, self.n_features, self.n_labels))
+
+    def closed_form_self_teaching_posterior(self, posterior):
+        """Calculates the self-teaching posterior p(x|D) directly from the
+        posterior over hypotheses, in linear time for lines and boundaries"""
+
+        rows = self.active_rows()
 
-        # save posterior
-        self.self_teaching_posterior = np.array(
-            [post.T for post in self_teaching_posterior])
+        # p(y|x, D), i.e. the posterior prob consistent with each outcome
+        prob_labels = np.stack([self.hyp_space.weighted_column_sums(
+            posterior, y, rows) for y in self.labels])
+        inv_prob_labels = np.divide(1, prob_labels,
+                                    out=np.zeros_like(prob_labels),
+                                    where=prob_labels > 0)
+
+        # for h with p(h|D) > 0, p(h|x, y = h(x)) = p(h|D) / p(y|x, D), so
+        # p(x|h) is 1 / p(h(x)|x, D) normalized over features
+        norm = np.sum([self.hyp_space.weighted_row_sums(inv_prob_labels[y], y,
+                                                        rows)
+                       for y in self.labels], axis=0)
+        weights = np.divide(self.learner_prior[:, 0, 0], norm,
+                            out=np.zeros_like(norm),
+                            where=posterior > 0)
+
+        # p(x|D) = \sum_h p(x|h) * p(h)
+        self_teaching_posterior = np.sum(
+            [self.hyp_space.weighted_column_sums(weights, y, rows) *
+             inv_prob_labels[y] for y in self.labels], axis=0)
+
+        return self_teaching_posterior / np.sum(self_teaching_posterior)
 
     def sample_self_teaching_posterior(self):
         """Sample a data point based off the self-teaching posterior"""
 
         # get teacher posterior and select a data point
         self_teaching_posterior = self.self_teaching_posterior
-        self_teaching_posterior_sample = self_teaching_posterior[0, :, 0]
+        self_teaching_posterior_sample = \
+            self_teaching_posterior[0, :, 0].copy()
 
         # check posterior sample is a valid probability distribution
         assert np.isclose(np.sum(self_teaching_posterior_sample), 1.0)
@@ -143,10 +188,12 @@ class ConceptSelfTeacher:
 
         self_teaching_data = -1
         if self.sampling == "max":
-            # select max
+            # select max, treating probabilities that only differ by
+            # rounding error as ties
             self_teaching_data = self.features[np.random.choice(
-                np.where(self_teaching_posterior_sample ==
-                         np.amax(self_teaching_posterior_sample))[0])]
+                np.where(np.isclose(
+                    self_teaching_posterior_sample,
+                    np.amax(self_teaching_posterior_sample)))[0])]
         else:
             # select proportionally
             if np.all(np.sum(self_teaching_posterior_sample)) != 0:
@@ -169,10 +216,22 @@ class ConceptSelfTeacher:
 
         # print("true hyp", self.true_hyp)
 
+        self.version_space = VersionSpace(self.hyp_space)
+        posterior = self.learner_prior[:, 0, 0]
+
         while hypothesis_found != True:
-            # run updates for learning and teacher posterior once
-            self.update_learner_posterior()
-            self.update_self_teaching_posterior()
+            if not self.hyp_space.dense_sums:
+                # scores follow from weighted sums over the posterior, by
+                # prefix sums for boundaries or over packed words
+                self_teaching_posterior = \
+                    self.closed_form_self_teaching_posterior(posterior)
+                self.self_teaching_posterior = np.broadcast_to(
+                    self_teaching_posterior[:, None],
+                    (self.n_active, self.n_features, self.n_labels))
+            else:
+                # run updates for learning and teacher posterior once
+                self.update_learner_posterior()
+                self.update_self_teaching_posterior()
 
             # sample data point from self-teaching
             self_teaching_sample_feature = self.sample_self_teaching_posterior()
@@ -184,33 +243,38 @@ class ConceptSelfTeacher:
             self.observed_labels = np.append(
                 self.observed_labels, self_teaching_sample_label)
 
-            # get learner posterior and broadcast
-            updated_learner_posterior = \
-                self.learner_posterior[:, self_teaching_sample_feature,
-                                       self_teaching_sample_label]
+            # get learner posterior after observing the sampled data point
+            self.version_space.observe(self_teaching_sample_feature,
+                                       self_teaching_sample_label)
+            updated_learner_posterior = self.version_space.posterior(
+                self.learner_prior[:, 0, 0], self.active_hyps)
 
             # check for valid probability distribution
             assert np.isclose(np.sum(updated_learner_posterior), 1.0)
 
             # update new learner posterior by broadcasting
-            self.learner_posterior = np.repeat(
-                updated_learner_posterior,
-                self.n_labels * self.n_features).reshape(
-                    self.n_hyp, self.n_features, self.n_labels)
-
-            # check if any hypothesis has probability one
-            if np.any(updated_learner_posterior == 1.0) and \
-               self.true_hyp_idx == \
-               np.asscalar((np.where(updated_learner_posterior == 1.0))[0]):
+            posterior = updated_learner_posterior
+            self.learner_posterior = np.broadcast_to(
+                posterior[:, None, None],
+                (self.n_active, self.n_features, self.n_labels))
+
+            # check if the true hypothesis is the only one remaining
+            if self.version_space.size() == 1 and \
+                    self.version_space.contains(self.true_hyp_idx):
                 hypothesis_found = True
-                true_hyp_found_idx = np.where(updated_learner_posterior == 1)
 
             # increment observations
             self.n_obs += 1
 
             # save posterior probability of true hypothesis
             self.posterior_true_hyp[self.n_obs] = updated_learner_posterior[
-                self.true_hyp_idx]
+                self.active_index(self.true_hyp_idx)]
+
+            # drop hypotheses eliminated by the observation
+            if self.active_set:
+                keep = posterior > 0
+                posterior = posterior[keep]
+                self.compact(keep)
 
         return self.n_obs, self.posterior_true_hyp, self.first_feature_prob
 
@@ -1,58 +1,127 @@
+import collections
+import threading
 import numpy as np
 import models.utils as utils
+from models.cooperative_inference import CooperativeInference
+
+
+class CIResultCache:
+    """Least recently used cache of cooperative inference results, keyed by
+    the hypothesis space, the inference options and the observations so
+    far. Lookups hold a lock, so the cache can be shared between threads"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Looks up the results of key, or None if they are missing"""
+        with self.lock:
+            if key not in self.results:
+                return None
+
+            self.results.move_to_end(key)
+            return self.results[key]
+
+    def put(self, key, results):
+        """Stores the results of key, evicting the least recently used"""
+        with self.lock:
+            self.results[key] = results
+            self.results.move_to_end(key)
+            while len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def __len__(self):
+        return len(self.results)
 
 
 class ConceptTeacher:
-    def __init__(self, n_features, hyp_space_type, true_hyp=None):
-        self.n_features = n_features
+    # results shared between runs, unless a model is given its own cache
+    ci_cache = CIResultCache()
+
+    def __init__(self, n_features=None, hyp_space_type=None, true_hyp=None,
+                 backend="dense", active_set=False, log_domain=False,
+                 dtype=np.float64, ci_tol=None, cache_results=False,
+                 ci_cache=None, hyp_space=None):
+        # use a shared hypothesis space, or look one up by type
+        self.hyp_space = utils.resolve_hyp_space(n_features, hyp_space_type,
+                                                 backend, hyp_space)
+        self.n_features = self.hyp_space.n_features
         self.n_labels = 2
         self.observed_features = np.array([])
         self.observed_labels = np.array([])
         self.n_obs = 0
         self.features = np.arange(self.n_features)
         self.labels = np.arange(self.n_labels)
-        if hyp_space_type == "boundary":
-            self.hyp_space = utils.create_boundary_hyp_space(self.n_features)
-        elif hyp_space_type == "line":
-            self.hyp_space = utils.create_line_hyp_space(self.n_features)
         self.n_hyp = len(self.hyp_space)
-        self.learner_prior = (1 / self.n_hyp) * \
-            np.ones((self.n_hyp, self.n_features, self.n_labels))
-        self.teacher_posterior = (1 / self.n_features * self.n_labels) * \
-            np.ones((self.n_hyp, self.n_features, self.n_labels))
+        self.learner_prior = np.broadcast_to(
+            1 / self.n_hyp, (self.n_hyp, self.n_features, self.n_labels))
+        self.teacher_posterior = np.broadcast_to(
+            1 / self.n_features * self.n_labels,
+            (self.n_hyp, self.n_features, self.n_labels))
         if true_hyp is not None:
             self.true_hyp = true_hyp
             self.true_hyp = self.true_hyp.tolist()
-            self.true_hyp_idx = \
-                np.where([np.all(true_hyp == hyp)
-                          for hyp in self.hyp_space])[0][0]
-            self.true_hyp_idx = self.true_hyp_idx.astype(int)
+            self.true_hyp_idx = self.hyp_space.index(true_hyp)
         else:
             self.true_hyp_idx = np.random.randint(self.n_hyp)
             self.true_hyp = self.hyp_space[self.true_hyp_idx]
 
         self.learner_posterior = self.learner_prior
+
+        # drop eliminated hypotheses from the hypothesis axis as the run
+        # progresses, keeping a map from active rows back to hypothesis ids
+        self.active_set = active_set
+        self.active_hyps = np.arange(self.n_hyp)
+        self.n_active = self.n_hyp
+        self.lik = None
+
+        # run cooperative inference in log space, where dtype can be
+        # float32 without underflow, and stop early once the teacher
+        # posterior changes by at most ci_tol
+        self.log_domain = log_domain
+        self.dtype = dtype
+        self.ci_tol = ci_tol
+        self.ci_trace = []
+
+        # reuse cooperative inference results of earlier runs that reached
+        # exactly the same observations
+        self.cache_results = cache_results
+        if ci_cache is not None:
+            self.ci_cache = ci_cache
+        self.ci_cache_hits = 0
+        self.ci_cache_misses = 0
+
         self.posterior_true_hyp = np.ones(self.n_features + 1)
         self.posterior_true_hyp[0] = 1 / self.n_hyp
         self.first_feature_prob = np.zeros(self.n_features)
 
     def likelihood(self):
-        """Calculates the likelihood of observing 
-        all possible pairs of data points"""
-        # returns a 66 x 11 x 2 matrix
+        """Calculates the likelihood of observing all possible pairs of data
+        points, which is computed once per hypothesis space"""
+        if self.lik is not None:
+            return self.lik
 
-        # TODO: modify function to take in multiple observations
+        return self.hyp_space.likelihood()
 
-        lik = np.ones((self.n_hyp, self.n_features, self.n_labels))
+    def active_index(self, hyp_idx):
+        """Finds the row of a hypothesis in the active set"""
+        return np.searchsorted(self.active_hyps, hyp_idx)
 
-        for i, hyp in enumerate(self.hyp_space):
-            for j, feature in enumerate(self.features):
-                for k, label in enumerate(self.labels):
-                    if hyp[feature] == label:
-                        lik[i, j, k] = 1
-                    else:
-                        lik[i, j, k] = 0
-        return lik
+    def compact(self, keep):
+        """Restricts all tensors over hypotheses to the rows in keep"""
+        self.active_hyps = self.active_hyps[keep]
+        self.n_active = len(self.active_hyps)
+        self.lik = self.hyp_space.likelihood()[self.active_hyps]
+
+        self.learner_prior = self.learner_prior[keep]
+        self.learner_posterior = self.learner_posterior[keep]
+        self.teacher_posterior = self.teacher_posterior[keep]
 
     def set_learner_posterior(self, learner_posterior):
         self.learner_posterior = learner_posterior
@@ -83,37 +152,35 @@ class ConceptTeacher:
         """Calculates the posterior of selecting data points by transforming the
         posterior p(y|x, h) to p(x|h)"""
 
-        # uniform joint over data, which is broadcasted into correct shape
+        # uniform joint over data, which is broadcast against hypotheses
         prob_joint_data = 1 / (self.n_features * self.n_labels) * \
             np.ones((self.n_features, self.n_labels))  # p(x, y)
-        prob_joint_data = np.tile(prob_joint_data, (self.n_hyp, 1, 1))
 
         # multiply with posterior to get overall joint
         # p(h, x, y) = p(h|, x, y) * p(x, y)
         learner_posterior = self.learner_posterior
         prob_joint = learner_posterior * prob_joint_data
 
-        # marginalize over y, i.e. p(h, x), and broadcast result
+        # marginalize over y, i.e. p(h, x)
         prob_joint_hyp_features = np.sum(prob_joint, axis=2)
-        prob_joint_hyp_features = np.repeat(
-            prob_joint_hyp_features, self.n_labels).reshape(
-                self.n_hyp, self.n_features, self.n_labels)
 
         # divide by prior over hypotheses to get conditional prob
         # marginalize over x, i.e. p(x | h) = p(h, x) / \sum_x p(h, x)
         prob_conditional_features = prob_joint_hyp_features / \
-            np.repeat(np.sum(prob_joint_hyp_features, axis=1),
-                      self.n_features).reshape(
-                          self.n_hyp, self.n_features, self.n_labels)
+            np.sum(prob_joint_hyp_features, axis=1, keepdims=True)
 
-        self.teacher_posterior = np.nan_to_num(prob_conditional_features)
+        # p(x|h) is the same for both labels, so broadcast it as a view
+        self.teacher_posterior = np.broadcast_to(
+            np.nan_to_num(prob_conditional_features)[:, :, None],
+            (self.n_active, self.n_features, self.n_labels))
 
     def sample_teacher_posterior(self):
         """Randomly samples a data point based off the teacher's posterior"""
 
         # get teacher likelihood and select data point
         teacher_posterior = self.teacher_posterior
-        teacher_posterior_true_hyp = teacher_posterior[self.true_hyp_idx, :, 0]
+        teacher_posterior_true_hyp = teacher_posterior[
+            self.active_index(self.true_hyp_idx), :, 0].copy()
 
         # set probability of selecting observed features to be zero
         self.observed_features = self.observed_features.astype(int)
@@ -123,18 +190,66 @@ class ConceptTeacher:
         if self.n_obs == 0:
             self.first_feature_prob = teacher_posterior_true_hyp
 
-        # select max
+        # select max, treating probabilities that only differ by rounding
+        # error as ties
         teacher_data = self.features[np.random.choice(
-            np.where(teacher_posterior_true_hyp ==
-                     np.amax(teacher_posterior_true_hyp))[0])]
+            np.where(np.isclose(teacher_posterior_true_hyp,
+                                np.amax(teacher_posterior_true_hyp)))[0])]
 
         return teacher_data
 
+    def create_cooperative_inference(self, n_iters=5):
+        """Creates the cooperative inference engine for the concepts, where
+        each learner posterior is the prior of the next iteration"""
+        lik = self.likelihood().reshape(self.n_active, -1).T
+
+        # data are feature/label pairs, which the teacher chooses by feature
+        return CooperativeInference(
+            lik, np.repeat(self.features, self.n_labels),
+            cumulative_prior=True, tol=self.ci_tol, max_iter=n_iters,
+            log_domain=self.log_domain, dtype=self.dtype)
+
     def run_ci(self, n_iters=5):
         """Run cooperative inference for n_iters"""
-        for i in range(n_iters):
-            self.update_learner_posterior()
-            self.update_teacher_posterior()
+        ci = self.create_cooperative_inference(n_iters)
+        teacher_posterior, learner_posterior = ci.run(
+            self.teacher_posterior[:, :, 0].T,
+            self.learner_posterior.reshape(self.n_active, -1).T)
+        self.ci_trace = ci.trace
+
+        shape = (self.n_active, self.n_features, self.n_labels)
+        self.learner_posterior = learner_posterior.T.reshape(shape)
+        self.teacher_posterior = np.broadcast_to(
+            teacher_posterior.T[:, :, None], shape)
+
+    def ci_cache_key(self, n_iters):
+        """Creates the key of the current state in the cooperative inference
+        cache, as the state only depends on the observations so far"""
+        observations = tuple(zip(self.observed_features.astype(int).tolist(),
+                                 self.observed_labels.astype(int).tolist()))
+        return (self.hyp_space, n_iters, self.ci_tol, self.log_domain,
+                np.dtype(self.dtype).str, self.active_set, observations)
+
+    def cached_run_ci(self, n_iters=5):
+        """Run cooperative inference for n_iters, or reuse the result of an
+        earlier run that reached the same observations"""
+        if not self.cache_results:
+            self.run_ci(n_iters)
+            return
+
+        key = self.ci_cache_key(n_iters)
+        results = self.ci_cache.get(key)
+        if results is not None:
+            self.learner_posterior, self.teacher_posterior, self.ci_trace = \
+                results
+            self.ci_cache_hits += 1
+        else:
+            # run outside the lock, so threads only wait for lookups
+            self.run_ci(n_iters)
+            self.learner_posterior.flags.writeable = False
+            self.ci_cache.put(key, (self.learner_posterior,
+                                    self.teacher_posterior, self.ci_trace))
+            self.ci_cache_misses += 1
 
     def run(self):
         """Run teacher until correct hypothesis is determined"""
@@ -143,7 +258,7 @@ class ConceptTeacher:
 
         while hypothesis_found is not True:
             # run ci updates for learner posterior and teacher likelihood
-            self.run_ci()
+            self.cached_run_ci()
 
             # sample data point from teacher
             teaching_sample_feature = self.sample_teacher_posterior()
@@ -155,18 +270,16 @@ class ConceptTeacher:
                                        teaching_sample_feature,
                                        teaching_sample_label]
 
-            # update new learner posterior
-            self.learner_posterior = np.repeat(
-                updated_learner_posterior, self.n_labels * self.n_features).reshape(
-                    self.n_hyp, self.n_features, self.n_labels)
-
-            # check if any hypothesis has probability one
-            if np.any(updated_learner_posterior == 1) and \
-                    self.true_hyp_idx == \
-                    np.asscalar((np.where(updated_learner_posterior == 1.0))[0]):
+            # update new learner posterior by broadcasting
+            self.learner_posterior = np.broadcast_to(
+                updated_learner_posterior[:, None, None],
+                (self.n_active, self.n_features, self.n_labels))
 
+            # check if the learner is certain of the true hypothesis, up to
+            # rounding error in cooperative inference
+            if np.isclose(updated_learner_posterior[
+                    self.active_index(self.true_hyp_idx)], 1.0):
                 hypothesis_found = True
-                true_hyp_found_idx = np.where(updated_learner_posterior == 1)
 
             # save observed feature and label
             self.observed_features = np.append(
@@ -178,6 +291,11 @@ class ConceptTeacher:
             self.n_obs += 1
 
             # save posterior probability of true hypothesis
-            self.posterior_true_hyp[self.n_obs] = updated_learner_posterior[self.true_hyp_idx]
+            self.posterior_true_hyp[self.n_obs] = updated_learner_posterior[
+                self.active_index(self.true_hyp_idx)]
+
+            # drop hypotheses eliminated by the observation
+            if self.active_set:
+                self.compact(updated_learner_posterior > 0)
 
         return self.n_obs, self.posterior_true_hyp, self.first_feature_prob
@@ -0,0 +1,279 @@
+import numpy as np
+from models import fixed_point
+from models import utils
+
+
+class CooperativeInference:
+    """Cooperative inference between a teacher choosing actions and a learner
+    reasoning about the data they produce. Arrays are indexed by data and
+    then hypotheses along their last two axes, and any leading axes are a
+    batch. Data are grouped into actions, and the teacher posterior p(a|h)
+    has one row per action"""
+
+    def __init__(self, lik, actions, cumulative_prior=False,
+                 likelihood_in_numerator=True,
+                 normalize_teacher_over_hyps=False, rho=1.0, method="picard",
+                 tol=0.00001, max_iter=10000, options=None,
+                 log_domain=False, dtype=np.float64):
+        self.lik = lik
+        self.n_data, self.n_hyp = lik.shape
+
+        # segment index grouping data by action
+        self.actions = np.asarray(actions)
+        self.action_order, self.action_starts = \
+            utils.create_segment_index(self.actions)
+        self.action_counts = np.bincount(self.actions)
+        self.n_actions = len(self.action_counts)
+
+        # use the learner posterior of each iteration as the prior of the
+        # next, instead of iterating to a fixed point for a fixed prior
+        self.cumulative_prior = cumulative_prior
+
+        # whether p(d|h) is in the numerator of the learner posterior, it
+        # is always in the normalizing constant
+        self.likelihood_in_numerator = likelihood_in_numerator
+
+        # normalize the teacher posterior over hypotheses for every action,
+        # before normalizing it over actions for every hypothesis
+        self.normalize_teacher_over_hyps = normalize_teacher_over_hyps
+
+        # how helpful the teacher is, where the teacher posterior is raised
+        # to the power rho before it is normalized
+        self.rho = rho
+
+        # fixed point solver, see models.fixed_point, where a tol of None
+        # always runs max_iter iterations
+        self.method = method
+        self.tol = tol
+        self.max_iter = max_iter
+        self.options = {} if options is None else options
+        self.trace = []
+
+        # run updates in log space, where dtype can be float32 without
+        # underflow
+        self.log_domain = log_domain
+        self.dtype = dtype
+        self.log_lik = None
+
+    def expand(self, teacher_posterior):
+        """Expands a posterior over actions to every data point"""
+        return teacher_posterior[..., self.actions, :]
+
+    def action_sum(self, values):
+        """Sums rows of values over the data points of each action"""
+        return utils.segment_sum(values, self.action_order,
+                                 self.action_starts, axis=-2)
+
+    def uniform_teacher_posterior(self):
+        """Creates a teacher posterior choosing every action equally"""
+        return (1 / self.n_actions) * np.ones((self.n_actions, self.n_hyp))
+
+    def log(self, x):
+        """Converts probabilities to log space in the precision of dtype"""
+        with np.errstate(divide="ignore"):
+            return np.log(x).astype(self.dtype)
+
+    def normalize(self, x, axis):
+        """Normalizes x along an axis, leaving all zero slices at zero"""
+        norm = np.sum(x, axis=axis, keepdims=True)
+        return np.divide(x, norm, out=np.zeros_like(x), where=norm != 0)
+
+    def log_normalize(self, x, axis):
+        """Normalizes log probabilities x along an axis, leaving slices of
+        zero probability at zero"""
+        log_norm = utils.logsumexp(x, axis=axis, keepdims=True)
+        with np.errstate(invalid="ignore"):
+            return np.where(np.isfinite(log_norm), x - log_norm, -np.inf)
+
+    def learner_posterior(self, teacher_posterior, prior, likelihood=True):
+        """Calculates p(h|d) \\propto p(d|h) p(a|h) p(h) for every data point,
+        leaving p(d|h) out of the numerator if likelihood is False"""
+        joint = self.expand(teacher_posterior) * prior
+        denom = np.sum(joint * self.lik, axis=-1, keepdims=True)
+
+        if likelihood:
+            joint = joint * self.lik
+
+        return np.divide(joint, denom, out=np.zeros_like(joint),
+                         where=denom != 0)
+
+    def teacher_posterior(self, learner_posterior):
+        """Calculates p(a|h) \\propto (\\sum_{d in a} p(h|d))^rho"""
+        teacher_posterior = self.action_sum(learner_posterior)
+
+        if self.rho != 1.0:
+            teacher_posterior = teacher_posterior ** self.rho
+
+        if self.normalize_teacher_over_hyps:
+            teacher_posterior = self.normalize(teacher_posterior, -1)
+
+        return self.normalize(teacher_posterior, -2)
+
+    def log_learner_posterior(self, log_teacher_posterior, log_prior,
+                              likelihood=True):
+        """Calculates learner_posterior in log space"""
+        log_joint = self.expand(log_teacher_posterior) + log_prior
+        log_denom = utils.logsumexp(log_joint + self.log_lik, axis=-1,
+                                    keepdims=True)
+
+        if likelihood:
+            log_joint = log_joint + self.log_lik
+
+        with np.errstate(invalid="ignore"):
+            return np.where(np.isfinite(log_denom), log_joint - log_denom,
+                            -np.inf)
+
+    def log_teacher_posterior(self, log_learner_posterior):
+        """Calculates teacher_posterior in log space"""
+        log_teacher_posterior = utils.segment_logsumexp(
+            log_learner_posterior, self.action_order, self.action_starts,
+            axis=-2)
+
+        if self.rho != 1.0:
+            log_teacher_posterior = self.rho * log_teacher_posterior
+
+        if self.normalize_teacher_over_hyps:
+            log_teacher_posterior = self.log_normalize(
+                log_teacher_posterior, -1)
+
+        return self.log_normalize(log_teacher_posterior, -2)
+
+    def initial_teacher_posterior(self, prior):
+        """Calculates the teacher posterior of a learner that assumes actions
+        are chosen uniformly"""
+        learner_posterior = self.learner_posterior(
+            np.ones((self.n_actions, self.n_hyp)), prior)
+        return self.teacher_posterior(learner_posterior)
+
+    def update(self, teacher_posterior, prior):
+        """Runs one iteration of cooperative inference for a fixed prior"""
+        learner_posterior = self.learner_posterior(
+            teacher_posterior, prior, self.likelihood_in_numerator)
+        return self.teacher_posterior(learner_posterior)
+
+    def log_floor(self):
+        """Finite stand-in for log(0) in log space iterates, so solvers can
+        take differences of them, which converts back to zero in dtype"""
+        return 2 * np.log(np.finfo(self.dtype).tiny)
+
+    def log_update(self, log_teacher_posterior, log_prior):
+        """Runs update on a log space iterate, which stays in log space"""
+        floor = self.log_floor()
+        log_teacher_posterior = np.where(log_teacher_posterior <= floor,
+                                         -np.inf, log_teacher_posterior)
+        log_learner_posterior = self.log_learner_posterior(
+            log_teacher_posterior, log_prior, self.likelihood_in_numerator)
+        return np.maximum(self.log_teacher_posterior(log_learner_posterior),
+                          floor)
+
+    def log_distance(self, log_teacher_posterior_new, log_teacher_posterior):
+        """Measures the change between log space iterates with norm on their
+        probabilities"""
+        return self.norm(np.exp(log_teacher_posterior_new) -
+                         np.exp(log_teacher_posterior))
+
+    def norm(self, change):
+        """Sums the change in the teacher posterior over data points, so
+        each action is weighted by its number of data points"""
+        return np.sum(self.action_counts[:, None] * np.absolute(change),
+                      axis=(-2, -1))
+
+    def project(self, teacher_posterior):
+        """Projects an extrapolated teacher posterior back to distributions
+        over actions"""
+        teacher_posterior = np.clip(teacher_posterior, 0, None)
+        return self.normalize(teacher_posterior, -2)
+
+    def log_project(self, log_teacher_posterior):
+        """Projects an extrapolated log space iterate back to distributions
+        over actions"""
+        floor = self.log_floor()
+        log_teacher_posterior = np.clip(log_teacher_posterior, floor, 0)
+        log_teacher_posterior = np.where(log_teacher_posterior <= floor,
+                                         -np.inf, log_teacher_posterior)
+        return np.maximum(self.log_normalize(log_teacher_posterior, -2),
+                          floor)
+
+    def run(self, teacher_posterior, prior):
+        """Runs cooperative inference from a teacher posterior, or a stack of
+        them with a prior for each, returning the teacher and learner
+        posteriors"""
+        if self.log_domain and self.log_lik is None:
+            self.log_lik = self.log(self.lik)
+
+        if self.cumulative_prior:
+            return self.run_cumulative(teacher_posterior, prior)
+
+        tol = 0 if self.tol is None else self.tol
+        options = dict(tol=tol, max_iter=self.max_iter, norm=self.norm,
+                       project=self.project, **self.options)
+
+        # in log space, the iterate stays in log space through the solve and
+        # is converted back once at the end
+        if self.log_domain:
+            update = self.log_update
+            update_prior = self.log(prior)
+            x0 = np.maximum(self.log(teacher_posterior), self.log_floor())
+            options.update(project=self.log_project,
+                           distance=self.log_distance)
+        else:
+            update = self.update
+            update_prior = prior
+            x0 = np.array(teacher_posterior)
+
+        if np.ndim(teacher_posterior) == 2:
+            teacher_posterior, self.trace = fixed_point.solve(
+                lambda x: update(x, update_prior), x0, method=self.method,
+                **options)
+        else:
+            # each element of the batch converges separately
+            update_prior = np.broadcast_to(
+                update_prior,
+                (len(teacher_posterior),) + np.shape(update_prior)[-2:])
+            teacher_posterior, self.trace = fixed_point.solve_batch(
+                lambda x, batch: update(x, update_prior[batch]), x0,
+                method=self.method, **options)
+
+        if self.log_domain:
+            teacher_posterior = np.exp(teacher_posterior)
+
+        return teacher_posterior, self.learner_posterior(teacher_posterior,
+                                                         prior)
+
+    def run_cumulative(self, teacher_posterior, prior):
+        """Runs cooperative inference where every learner posterior becomes
+        the prior of the next iteration"""
+        if self.log_domain:
+            teacher_posterior = self.log(teacher_posterior)
+            learner_posterior = self.log(prior)
+        else:
+            learner_posterior = prior
+
+        self.trace = []
+        for i in range(self.max_iter):
+            if self.log_domain:
+                learner_posterior = self.log_learner_posterior(
+                    teacher_posterior, learner_posterior,
+                    self.likelihood_in_numerator)
+                teacher_posterior_new = self.log_teacher_posterior(
+                    learner_posterior)
+                change = self.norm(np.exp(teacher_posterior_new) -
+                                   np.exp(teacher_posterior))
+            else:
+                learner_posterior = self.learner_posterior(
+                    teacher_posterior, learner_posterior,
+                    self.likelihood_in_numerator)
+                teacher_posterior_new = self.teacher_posterior(
+                    learner_posterior)
+                change = self.norm(teacher_posterior_new - teacher_posterior)
+
+            teacher_posterior = teacher_posterior_new
+            self.trace.append(change)
+
+            if self.tol is not None and np.all(change <= self.tol):
+                break
+
+        if self.log_domain:
+            return np.exp(teacher_posterior), np.exp(learner_posterior)
+
+        return teacher_posterior, learner_posterior
@@ -1,85 +1,125 @@
 import numpy as np
+from models import graph_likelihood
 from models import utils
+from models.intervention_index import get_intervention_index
 
 
 class DirectedGraph:
+    """A causal graph with a table p(x|parents) for every node. Graphs are
+    immutable, with parents precomputed for the graph and for the graph
+    after every intervention, so they can be shared between threads"""
+
+    __slots__ = ("graph", "n_nodes", "n_actions", "t", "b", "nodes",
+                 "intervention_index", "observations", "n_observations",
+                 "cpds", "parents", "children", "intervened_graphs",
+                 "intervened_parents")
+
     def __init__(self, edges, cpds, t=0.8, b=0.01):
-        self.graph = edges
-        self.n_nodes = self.graph.shape[0]
-        self.n_actions = self.n_nodes
-        self.n_observations = 2 ** self.n_nodes
-        self.t = t
-        self.b = b
-
-        self.nodes = np.arange(self.n_nodes)
-        self.observations = np.array([[0, 1, 1], [0, 1, 2],
-                                      [0, 2, 1], [0, 2, 2],
-                                      [1, 0, 1], [1, 0, 2],
-                                      [1, 1, 0], [1, 2, 0],
-                                      [2, 0, 1], [2, 0, 2],
-                                      [2, 1, 0], [2, 2, 0]])
-        self.cpds = cpds
-
-        assert self.n_nodes >= 0
-        assert self.t >= 0.0
-        assert self.b >= 0.0
-
-    def get_parents(self, node, graph):
+        init = object.__setattr__
+
+        graph = read_only(edges)
+        n_nodes = graph.shape[0]
+        init(self, "graph", graph)
+        init(self, "n_nodes", n_nodes)
+        init(self, "n_actions", n_nodes)
+        init(self, "t", t)
+        init(self, "b", b)
+
+        init(self, "nodes", read_only(np.arange(n_nodes)))
+
+        # every observation after intervening on a single node
+        index = get_intervention_index(n_nodes)
+        init(self, "intervention_index", index)
+        init(self, "observations", index.observations)
+        init(self, "n_observations", index.n_observations)
+        init(self, "cpds", tuple(read_only(cpd) for cpd in cpds))
+
+        assert n_nodes >= 0
+        assert t >= 0.0
+        assert b >= 0.0
+
+        # parents and children of every node
+        init(self, "parents", tuple(tuple(np.flatnonzero(graph[:, node]))
+                                    for node in range(n_nodes)))
+        init(self, "children", tuple(tuple(np.flatnonzero(graph[node]))
+                                     for node in range(n_nodes)))
+
+        # the graph after every intervention, without the edges into the
+        # intervened node
+        intervened_graphs = []
+        intervened_parents = []
+        for intervention in range(n_nodes):
+            intervened_graph = graph.copy()
+            intervened_graph[:, intervention] = 0
+            intervened_graphs.append(read_only(intervened_graph))
+            intervened_parents.append(tuple(
+                () if node == intervention else self.parents[node]
+                for node in range(n_nodes)))
+        init(self, "intervened_graphs", tuple(intervened_graphs))
+        init(self, "intervened_parents", tuple(intervened_parents))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DirectedGraph is immutable")
+
+    def __reduce__(self):
+        return (DirectedGraph, (self.graph, self.cpds, self.t, self.b))
+
+    def get_parents(self, node, graph=None):
         """Calculate the parents of a given node"""
+        if graph is None or graph is self.graph:
+            return np.array(self.parents[node], dtype=int)
+
         return np.flatnonzero(graph[:, node])
 
-    def get_children(self, node, graph):
+    def get_children(self, node, graph=None):
         """Calculate the children of a given node"""
+        if graph is None or graph is self.graph:
+            return np.array(self.children[node], dtype=int)
+
         return np.flatnonzero(graph[node])
 
     def intervene(self, intervention):
-        """Takes a given observation and intervenes on the node"""
+        """Returns the adjacency matrix after intervening on a node, which
+        removes the edges from its parents"""
 
         # check that intervention is valid
         assert intervention >= 0 and intervention < self.n_nodes
 
-        # set intervened node to be one
-        self.intervened_observation = np.zeros(self.n_nodes)
-        self.intervened_observation[intervention] = 1
-
-        # create intervened adjacency matrix
-        self.intervened_graph = self.graph.copy()
-
-        # remove edges from parents to intervened nodes
-        intervened_parents = self.get_parents(intervention, self.graph)
-        self.intervened_graph[intervened_parents,
-                              intervention] = 0
+        return self.intervened_graphs[intervention]
 
     def observation_likelihood(self, observation):
         """Calculate the likelihood of a given observation"""
 
         # determine which node to intervene on
-        intervened_node = np.where(observation == 0)[0][0]
+        intervened_node = int(np.argmin(observation))
+        parents = self.intervened_parents[intervened_node]
 
-        # apply intervention
-        self.intervene(intervened_node)
+        # subtract one since 1 = off, 2 = on, and set intervened node on
+        states = [1 if value == 0 else int(value) - 1
+                  for value in observation]
 
         likelihood = 1
+        for node in range(self.n_nodes):
+            if node == intervened_node:
+                continue
 
-        observed_nodes = np.where(observation != 0)[0]
-
-        # subtract one since 1 = off, 2 = on
-        self.intervened_observation[observed_nodes] = \
-            observation[observed_nodes] - 1
-
-        for node in observed_nodes:
-            node_parents = self.get_parents(node, self.intervened_graph)
-            observation_idx = np.append(
-                self.intervened_observation[node_parents],
-                self.intervened_observation[node]).astype(int)
-            likelihood = likelihood * \
-                self.cpds[node][tuple(observation_idx)]
+            observation_idx = tuple(states[parent]
+                                    for parent in parents[node]) + \
+                (states[node],)
+            likelihood = likelihood * self.cpds[node][observation_idx]
 
         return likelihood
 
     def likelihood(self):
-        lik = [self.observation_likelihood(obs) for obs in self.observations]
-        return lik
+        """Calculates the likelihood of every observation at once"""
+        return graph_likelihood.cached_likelihood([self])[0]
+
+
+def read_only(array):
+    """Copies an array into one that cannot be written to"""
+    array = np.array(array)
+    array.setflags(write=False)
+    return array
 
 
 if __name__ == "__main__":
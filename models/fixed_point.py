@@ -0,0 +1,194 @@
+import numpy as np
+
+
+def l1_norm(x):
+    """Sums the absolute values of all elements"""
+    return np.sum(np.absolute(x))
+
+
+def change(x_new, x, norm, distance=None):
+    """Measures the change between iterates as norm(x_new - x), or as
+    distance(x_new, x) for iterates that are not compared by their
+    difference"""
+    if distance is None:
+        return norm(x_new - x)
+
+    return distance(x_new, x)
+
+
+def picard(g, x0, tol=0.00001, max_iter=10000, norm=l1_norm, project=None,
+           distance=None):
+    """Iterates x = g(x) until the change is at most tol, returning the
+    final iterate and the change at every iteration"""
+    x = x0
+    trace = []
+
+    for _ in range(max_iter):
+        x_new = g(x)
+        trace.append(change(x_new, x, norm, distance))
+        x = x_new
+
+        if trace[-1] <= tol:
+            break
+
+    return x, trace
+
+
+def over_relaxation(g, x0, tol=0.00001, max_iter=10000, norm=l1_norm,
+                    project=None, distance=None, omega=1.5):
+    """Iterates x = x + omega * (g(x) - x), which over-relaxes the fixed
+    point iteration for 1 < omega < 2"""
+    x = x0
+    trace = []
+
+    for _ in range(max_iter):
+        gx = g(x)
+        trace.append(change(gx, x, norm, distance))
+
+        if trace[-1] <= tol:
+            return gx, trace
+
+        x = x + omega * (gx - x)
+        if project is not None:
+            x = project(x)
+
+    return x, trace
+
+
+def anderson(g, x0, tol=0.00001, max_iter=10000, norm=l1_norm, project=None,
+             distance=None, m=5, beta=1.0):
+    """Iterates x = g(x) with Anderson acceleration, extrapolating from the
+    last m iterates by least squares on their residuals"""
+    shape = np.shape(x0)
+    x = np.ravel(x0)
+    trace = []
+
+    # history of g(x) and residuals g(x) - x
+    gxs = []
+    residuals = []
+
+    for _ in range(max_iter):
+        gx = np.ravel(g(x.reshape(shape)))
+        residual = gx - x
+        trace.append(change(gx.reshape(shape), x.reshape(shape), norm,
+                            distance))
+
+        if trace[-1] <= tol:
+            return gx.reshape(shape), trace
+
+        gxs = (gxs + [gx])[-(m + 1):]
+        residuals = (residuals + [residual])[-(m + 1):]
+
+        if len(residuals) > 1:
+            # mix previous iterates to minimize the extrapolated residual
+            d_residuals = np.diff(residuals, axis=0).T
+            d_gxs = np.diff(gxs, axis=0).T
+            gamma = np.linalg.lstsq(d_residuals, residual, rcond=None)[0]
+
+            x = gx - np.dot(d_gxs, gamma) - \
+                (1 - beta) * (residual - np.dot(d_residuals, gamma))
+        else:
+            x = gx
+
+        if project is not None:
+            x = np.ravel(project(x.reshape(shape)))
+
+    return x.reshape(shape), trace
+
+
+def batch_l1_norm(x):
+    """Sums the absolute values of each element of a batch"""
+    return np.sum(np.absolute(x).reshape(len(x), -1), axis=1)
+
+
+def batch_over_relaxation(g, x0, tol=0.00001, max_iter=10000,
+                          norm=batch_l1_norm, project=None, distance=None,
+                          omega=1.5):
+    """Runs over_relaxation on every element of a batch x0 at once, where
+    g(x, batch) maps the elements at indices batch. Elements stop being
+    updated once they converge, and the trace holds the change of every
+    element at every iteration, or nan once it has converged"""
+    x = np.array(x0)
+    active = np.arange(len(x))
+    trace = []
+
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+
+        gx = g(x[active], active)
+        changes = change(gx, x[active], norm, distance)
+        converged = changes <= tol
+
+        residuals = np.full(len(x), np.nan)
+        residuals[active] = changes
+        trace.append(residuals)
+
+        if omega == 1.0:
+            x[active] = gx
+        else:
+            x[active[converged]] = gx[converged]
+            relaxed = x[active[~converged]] + \
+                omega * (gx[~converged] - x[active[~converged]])
+            if project is not None:
+                relaxed = project(relaxed)
+            x[active[~converged]] = relaxed
+
+        # mask out converged elements
+        active = active[~converged]
+
+    return x, np.array(trace)
+
+
+def batch_picard(g, x0, tol=0.00001, max_iter=10000, norm=batch_l1_norm,
+                 project=None, distance=None):
+    """Runs picard on every element of a batch x0 at once"""
+    return batch_over_relaxation(g, x0, tol=tol, max_iter=max_iter,
+                                 norm=norm, project=project,
+                                 distance=distance, omega=1.0)
+
+
+solvers = {"picard": picard,
+           "over_relaxation": over_relaxation,
+           "anderson": anderson}
+
+batch_solvers = {"picard": batch_picard,
+                 "over_relaxation": batch_over_relaxation}
+
+
+def solve(g, x0, method="picard", **options):
+    """Finds a fixed point of g starting from x0 with the named solver"""
+    if method not in solvers:
+        raise ValueError("Unknown fixed point solver: {}".format(method))
+
+    return solvers[method](g, x0, **options)
+
+
+def solve_batch(g, x0, method="picard", **options):
+    """Finds a fixed point of g for every element of a batch x0, where
+    g(x, batch) maps the elements at indices batch. Solvers without a
+    batched version are run on each element in turn"""
+    if method in batch_solvers:
+        return batch_solvers[method](g, x0, **options)
+
+    norm = options.pop("norm", batch_l1_norm)
+    distance = options.pop("distance", None)
+    if distance is not None:
+        options["distance"] = lambda x_new, x: distance(x_new[None],
+                                                        x[None])[0]
+
+    xs = []
+    traces = []
+    for i in range(len(x0)):
+        x, trace = solve(lambda x: g(x[None], np.array([i]))[0], x0[i],
+                         method=method, norm=lambda x: norm(x[None])[0],
+                         **options)
+        xs.append(x)
+        traces.append(trace)
+
+    # pad traces of elements that converged early with nan
+    trace = np.full((max(len(t) for t in traces), len(x0)), np.nan)
+    for i, t in enumerate(traces):
+        trace[:len(t), i] = t
+
+    return np.array(xs), trace
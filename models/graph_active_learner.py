@@ -1,6 +1,8 @@
 import numpy as np
 from models import dag
+from models import graph_likelihood
 from models import utils
+from models.intervention_index import get_intervention_index
 
 
 class GraphActiveLearner:
@@ -8,24 +10,18 @@ class GraphActiveLearner:
         self.hyp = graphs
         self.n_hyp = len(graphs)
 
-        self.actions = np.array([1, 2, 3])
+        self.intervention_index = get_intervention_index(graphs[0].n_nodes)
+        self.actions = np.arange(1, self.intervention_index.n_actions + 1)
         self.n_actions = len(self.actions)
 
         # the set of possible observations
         # 0 = intervene, 1 = observed_off, 2 = observed_on
-        self.observations = np.array([[0, 1, 1], [0, 1, 2],
-                                      [0, 2, 1], [0, 2, 2],
-                                      [1, 0, 1], [1, 0, 2],
-                                      [1, 1, 0], [1, 2, 0],
-                                      [2, 0, 1], [2, 0, 2],
-                                      [2, 1, 0], [2, 2, 0]])
-        self.n_observations = len(self.observations)
+        self.observations = self.intervention_index.observations
+        self.n_observations = self.intervention_index.n_observations
 
         # the set of possible interventions
-        self.interventions = np.array([0, 0, 0, 0,
-                                       1, 1, 2, 2,
-                                       1, 1, 2, 2])
-        self.n_interventions = len(np.unique(self.interventions))
+        self.interventions = self.intervention_index.interventions
+        self.n_interventions = self.intervention_index.n_interventions
 
         # prior over graphs
         self.prior = 1 / self.n_hyp * \
@@ -36,14 +32,10 @@ class GraphActiveLearner:
     def likelihood(self):
         """Calculate p(d|h, i)"""
 
-        lik = np.zeros((self.n_hyp,
-                        self.n_observations))
+        lik = graph_likelihood.cached_likelihood(self.hyp)
 
-        for i, h in enumerate(self.hyp):
-            lik[i] = h.likelihood()
-
-        # the likelihood should sum to 3.0
-        assert np.allclose(np.sum(lik, axis=1), 3.0)
+        # the likelihood should sum to the number of interventions
+        assert np.allclose(np.sum(lik, axis=1), self.n_interventions)
 
         return lik
 
@@ -53,8 +45,9 @@ class GraphActiveLearner:
         self.posterior = self.likelihood() * self.prior
         denom = np.sum(self.posterior, axis=0)
 
-        self.posterior = np.nan_to_num(np.divide(
-            self.posterior, denom, where=denom != 0))
+        self.posterior = np.divide(self.posterior, denom,
+                                   out=np.zeros_like(self.posterior),
+                                   where=denom != 0)
 
         # check sum of posterior is either 0s or 1s
         assert np.all(np.logical_or(
@@ -65,14 +58,18 @@ class GraphActiveLearner:
         prior_entropy = np.nansum(self.prior * np.log2(1/self.prior), axis=0)
 
         # only consider unique interventions
-        unique_interventions = np.array([0, 4, 6])
-        prior_entropy = prior_entropy[unique_interventions]
+        prior_entropy = prior_entropy[
+            self.intervention_index.first_interventions]
 
         return prior_entropy
 
     def posterior_entropy(self):
-        inv_posterior = np.divide(1, self.posterior, where=self.posterior != 0)
-        log_inv_posterior = np.log2(inv_posterior, where=inv_posterior != 0)
+        inv_posterior = np.divide(1, self.posterior,
+                                  out=np.zeros_like(self.posterior),
+                                  where=self.posterior != 0)
+        log_inv_posterior = np.log2(inv_posterior,
+                                    out=np.zeros_like(inv_posterior),
+                                    where=inv_posterior != 0)
         posterior_entropy = np.nansum(
             self.posterior * log_inv_posterior, axis=0)
 
@@ -81,8 +78,9 @@ class GraphActiveLearner:
     def observation_likelihood(self):
         obs_lik = np.sum(self.prior * self.likelihood(), axis=0)
 
-        assert np.array_equal(self.posterior, np.nan_to_num(
-            np.divide((self.likelihood() * self.prior), obs_lik, where=obs_lik != 0)))
+        joint = self.likelihood() * self.prior
+        assert np.array_equal(self.posterior, np.divide(
+            joint, obs_lik, out=np.zeros_like(joint), where=obs_lik != 0))
 
         return obs_lik
 
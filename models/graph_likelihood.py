@@ -0,0 +1,178 @@
+import collections
+import threading
+import numpy as np
+from models import utils
+from models.intervention_index import get_intervention_index
+
+
+def state_bits(n_nodes):
+    """Lists the off/on state of every node in every joint state, where the
+    first node is the most significant bit of the joint state"""
+    states = np.arange(2 ** n_nodes)
+    return (states[:, None] >> np.arange(n_nodes - 1, -1, -1)) & 1
+
+
+def state_codes(observations):
+    """Finds the joint state of every observation, where intervened nodes
+    are on"""
+    observations = np.asarray(observations)
+    states = np.where(observations != 0, observations - 1, 1)
+    return states @ (1 << np.arange(observations.shape[-1] - 1, -1, -1))
+
+
+def stack_cpds(graphs):
+    """Stacks the tables of all graphs into p(x_j|parents) for every node j
+    of every joint state x, with shape (n_graphs, n_nodes, 2 ** n_nodes)"""
+    n_nodes = graphs[0].n_nodes
+    bits = state_bits(n_nodes)
+
+    tables = np.zeros((len(graphs), n_nodes, len(bits)))
+    for i, graph in enumerate(graphs):
+        for node in range(n_nodes):
+            idx = tuple(bits[:, parent] for parent in graph.parents[node]) + \
+                (bits[:, node],)
+            tables[i, node] = graph.cpds[node][idx]
+
+    return tables
+
+
+def likelihood(graphs, observations=None, tables=None):
+    """Calculates p(d|h, i) of every graph for every observation at once,
+    with shape (n_graphs, n_observations). Intervened nodes are set on and
+    not scored, and observations default to every single node intervention
+    of the graphs"""
+    if observations is None:
+        observations = get_intervention_index(graphs[0].n_nodes).observations
+    if tables is None:
+        tables = stack_cpds(graphs)
+
+    observations = np.asarray(observations)
+    codes = state_codes(observations)
+
+    # p(x_j|parents) of every node for every observation, where intervened
+    # nodes contribute one
+    node_lik = tables[:, :, codes].transpose(0, 2, 1)
+    node_lik = np.where(observations != 0, node_lik, 1.0)
+
+    return np.prod(node_lik, axis=-1)
+
+
+def has_noisy_or_cpds(graph):
+    """Checks whether the tables of a graph are the noisy-OR tables of its t
+    and b, which stay the same when the graph is relabelled"""
+    return all(np.array_equal(cpd, utils.noisy_or_cpd(len(parents), graph.t,
+                                                      graph.b))
+               for cpd, parents in zip(graph.cpds, graph.parents))
+
+
+def orbits(graphs):
+    """Groups graphs with noisy-OR tables that are relabellings of each other
+    with the same t and b, returning the representative of the orbit of
+    every graph and the relabelling of every graph that gives its canonical
+    form. Graphs with other tables are in their own orbits"""
+    keys, perms = utils.canonical_forms([graph.graph for graph in graphs])
+
+    representatives = {}
+    orbit = np.zeros(len(graphs), dtype=int)
+    for i, (graph, key) in enumerate(zip(graphs, keys)):
+        if has_noisy_or_cpds(graph):
+            orbit[i] = representatives.setdefault((key, graph.t, graph.b), i)
+        else:
+            orbit[i] = i
+
+    return orbit, perms
+
+
+def symmetric_likelihood(graphs):
+    """Calculates the likelihood of every graph over every single node
+    intervention once per orbit of relabelled graphs, and permutes the
+    observations of the representative's row for every other graph"""
+    index = get_intervention_index(graphs[0].n_nodes)
+    orbit, perms = orbits(graphs)
+    representatives, rep_rows = np.unique(orbit, return_inverse=True)
+    rep_lik = likelihood([graphs[i] for i in representatives])
+
+    # node perm[i] of a graph plays the role of node rep_perm[i] of its
+    # representative, so observations are relabelled node by node
+    inv_perms = np.argsort(perms, axis=1)
+    nodes = np.take_along_axis(perms, inv_perms[orbit], axis=1)
+    rep_observations = index.observations[:, nodes].transpose(1, 0, 2)
+
+    return rep_lik[rep_rows[:, None], index.index(rep_observations)]
+
+
+class LikelihoodCache:
+    """Least recently used cache of the likelihood row of each graph over
+    every single node intervention, keyed by its adjacency matrix, t, b and
+    tables. Missing rows can be computed once per orbit of relabelled
+    graphs with symmetric. Lookups hold a lock, so the cache can be shared
+    between threads"""
+
+    def __init__(self, maxsize=4096, symmetric=False):
+        self.maxsize = maxsize
+        self.symmetric = symmetric
+        self.rows = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, graph):
+        graph_edges = np.asarray(graph.graph, dtype=np.uint8)
+        tables = tuple(np.asarray(cpd, dtype=float).tobytes()
+                       for cpd in graph.cpds)
+        return (graph_edges.shape, graph_edges.tobytes(), graph.t, graph.b,
+                tables)
+
+    def likelihood(self, graphs):
+        """Looks up the likelihood of every graph, computing all rows that
+        are missing in one batch"""
+        keys = [self.key(graph) for graph in graphs]
+
+        with self.lock:
+            return self.lookup(graphs, keys)
+
+    def lookup(self, graphs, keys):
+        """Looks up the rows of keys while holding the lock"""
+        missing = {}
+        for graph, key in zip(graphs, keys):
+            if key in self.rows:
+                self.rows.move_to_end(key)
+                self.hits += 1
+            elif key not in missing:
+                missing[key] = graph
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if missing:
+            if self.symmetric:
+                lik = symmetric_likelihood(list(missing.values()))
+            else:
+                lik = likelihood(list(missing.values()))
+            lik.setflags(write=False)
+            for key, row in zip(missing, lik):
+                self.rows[key] = row
+
+        lik = np.stack([self.rows[key] for key in keys])
+
+        # evict the least recently used rows
+        while len(self.rows) > self.maxsize:
+            self.rows.popitem(last=False)
+
+        return lik
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# shared by all graph models
+likelihood_cache = LikelihoodCache(symmetric=True)
+
+
+def cached_likelihood(graphs):
+    """Calculates p(d|h, i) of every graph for every single node
+    intervention, reusing rows computed for earlier calls"""
+    return likelihood_cache.likelihood(graphs)
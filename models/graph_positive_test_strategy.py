@@ -1,4 +1,3 @@
-import queue
 import numpy as np
 from models import dag
 from models import utils
@@ -9,42 +8,39 @@ class GraphPositiveTestStrategy:
         self.graphs = graphs
         self.n_graphs = len(graphs)
 
-        self.actions = np.array([0, 1, 2])
+        self.actions = np.arange(graphs[0].n_nodes)
         self.n_actions = len(self.actions)
 
-    def descendant_links(self, graph, action):
-        """Calculate the number of descendant links of a graph after
-        performing a specified action"""
-        descendants = queue.Queue()
-        n_descendants = 0
-
-        items = list(graph.get_children(action, graph.graph))
-        for item in items:
-            descendants.put(item)
+        # stacked adjacency matrices of all graphs
+        self.edges = np.stack([graph.graph for graph in graphs])
 
-        while not descendants.empty():
-            n_descendants += 1
-            descendant = descendants.get()
-            items = list(graph.get_children(descendant, graph.graph))
-            for item in items:
-                descendants.put(item)
+    def descendants(self):
+        """Finds the descendants of every node of every graph at once"""
+        return utils.transitive_closure(self.edges)
 
-        return n_descendants
+    def descendant_links(self, graph, action):
+        """Calculate the number of descendants of a graph after performing a
+        specified action"""
+        return int(np.sum(utils.transitive_closure(graph.graph)[action]))
 
     def total_links(self, graph):
         """Calculate the total number of links in a graph"""
         n_links = np.sum(graph.graph == 1)
         return n_links
 
-    def positive_test_strategy(self):
-        descendant_links = np.zeros((self.n_graphs, self.n_actions))
-        total_links = np.zeros(self.n_graphs)
+    def link_scores(self):
+        """Calculates the number of descendants of every action relative to
+        the number of links, for every graph, where graphs without links
+        score zero"""
+        descendant_links = np.sum(self.descendants(), axis=-1)[
+            :, self.actions]
+        total_links = np.sum(self.edges == 1, axis=(1, 2))[:, None]
 
-        for i, graph in enumerate(self.graphs):
-            total_links[i] = self.total_links(graph)
-            for j, action in enumerate(self.actions):
-                descendant_links[i, j] = self.descendant_links(graph, action)
+        return np.divide(descendant_links, total_links,
+                         out=np.zeros(descendant_links.shape),
+                         where=total_links > 0)
 
-        pts = np.max((descendant_links.T / total_links).T, axis=0)
+    def positive_test_strategy(self):
+        pts = np.max(self.link_scores(), axis=0)
         pts = pts / np.sum(pts)
         return pts
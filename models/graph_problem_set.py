@@ -0,0 +1,119 @@
+import itertools
+import numpy as np
+from models import graph_likelihood
+from models import utils
+from models.graph_positive_test_strategy import GraphPositiveTestStrategy
+from models.intervention_index import get_intervention_index
+
+
+class GraphProblemSet:
+    """A set of active learning problems over a shared list of graphs, where
+    every problem is a row of indices into the graphs. The likelihood of
+    every graph is computed once, and the predictions of the active
+    learner, self-teacher and positive test strategy are computed for all
+    problems at once"""
+
+    def __init__(self, graphs, problems):
+        self.graphs = list(graphs)
+        self.n_graphs = len(self.graphs)
+        self.problems = np.asarray(problems)
+        self.n_problems, self.n_hyp = self.problems.shape
+
+        index = get_intervention_index(self.graphs[0].n_nodes)
+        self.n_actions = index.n_actions
+        self.n_observations = index.n_observations
+        self.interventions = index.interventions
+        self.intervention_order = index.intervention_order
+        self.intervention_starts = index.intervention_starts
+
+        # p(d|h, i) of every graph, and of the graphs of every problem
+        self.lik = graph_likelihood.cached_likelihood(self.graphs)
+        self.problem_lik = self.lik[self.problems]
+
+        # uniform prior over the graphs of every problem
+        self.prior = 1 / self.n_hyp
+
+    @classmethod
+    def from_problems(cls, problems):
+        """Creates a problem set from a list of problems, each a list of
+        graphs, where graphs with the same structure, parameters and tables
+        are stored once"""
+        graphs = []
+        keys = {}
+        indices = []
+        for problem in problems:
+            problem_indices = []
+            for graph in problem:
+                key = graph_likelihood.likelihood_cache.key(graph)
+                if key not in keys:
+                    keys[key] = len(graphs)
+                    graphs.append(graph)
+                problem_indices.append(keys[key])
+            indices.append(problem_indices)
+
+        return cls(graphs, indices)
+
+    @classmethod
+    def from_subsets(cls, graphs, k=2):
+        """Creates a problem for every subset of k graphs"""
+        problems = list(itertools.combinations(range(len(graphs)), k))
+        return cls(graphs, problems)
+
+    def intervention_sum(self, values):
+        """Sums values over the observations of each intervention along the
+        last axis"""
+        return utils.segment_sum(values, self.intervention_order,
+                                 self.intervention_starts, axis=-1)
+
+    def posterior(self, lik):
+        """Normalizes the likelihood times the prior over the graphs of each
+        problem, leaving observations no graph predicts at zero"""
+        posterior = lik * self.prior
+        denom = np.sum(posterior, axis=1, keepdims=True)
+        return np.divide(posterior, denom, out=np.zeros_like(posterior),
+                         where=denom != 0)
+
+    def expected_information_gain(self):
+        """Calculates the normalized expected information gain of every
+        intervention for every problem, as in GraphActiveLearner"""
+        posterior = self.posterior(self.problem_lik)
+
+        # entropy of the posterior after every observation
+        inv_posterior = np.divide(1, posterior, out=np.zeros_like(posterior),
+                                  where=posterior != 0)
+        log_inv_posterior = np.log2(inv_posterior,
+                                    out=np.zeros_like(inv_posterior),
+                                    where=inv_posterior != 0)
+        posterior_entropy = np.sum(posterior * log_inv_posterior, axis=1)
+
+        # weighted by the probability of every observation
+        obs_lik = np.sum(self.problem_lik * self.prior, axis=1)
+        weighted_posterior_entropy = self.intervention_sum(
+            obs_lik * posterior_entropy)
+
+        prior_entropy = np.log2(self.n_hyp)
+        eig = prior_entropy - weighted_posterior_entropy
+        return eig / np.sum(eig, axis=1, keepdims=True)
+
+    def self_teaching_posterior(self):
+        """Calculates the self-teaching posterior over interventions for
+        every problem, as in GraphSelfTeacher"""
+        learner_posterior = self.posterior(
+            self.problem_lik * (1 / self.n_actions))
+
+        # p(d, i|h) \propto p(h|d, i) * p(d, i)
+        int_obs_posterior = learner_posterior * (1 / self.n_observations)
+        int_obs_posterior = int_obs_posterior / \
+            np.sum(int_obs_posterior, axis=2, keepdims=True)
+
+        # p(d, i) = \sum_h' p(d, i|h') * p(h'), summed over outcomes
+        self_teaching_posterior = np.sum(int_obs_posterior * self.prior,
+                                         axis=1)
+        return self.intervention_sum(self_teaching_posterior)
+
+    def positive_test_strategy(self):
+        """Calculates the positive test strategy of every problem, counting
+        the descendants of every graph once"""
+        link_scores = GraphPositiveTestStrategy(self.graphs).link_scores()
+        scores = np.max(link_scores[self.problems], axis=1)
+        return scores / np.sum(scores, axis=1, keepdims=True)
@@ -1,7 +1,9 @@
 import numpy as np
 from models import dag
+from models import graph_likelihood
 from models import utils
 from models.graph_teacher import GraphTeacher
+from models.intervention_index import get_intervention_index
 
 
 class GraphSelfTeacher:
@@ -9,25 +11,23 @@ class GraphSelfTeacher:
         self.hyp = graphs
         self.n_hyp = len(graphs)
 
-        self.actions = np.array([1, 2, 3])
+        index = get_intervention_index(graphs[0].n_nodes)
+        self.actions = np.arange(1, index.n_actions + 1)
         self.n_actions = len(self.actions)
 
         # the set of possible observations
         # 0 = intervene, 1 = observed_off, 2 = observed_on
-        self.observations = np.array([[0, 1, 1], [0, 1, 2],
-                                      [0, 2, 1], [0, 2, 2],
-                                      [1, 0, 1], [1, 0, 2],
-                                      [1, 1, 0], [1, 2, 0],
-                                      [2, 0, 1], [2, 0, 2],
-                                      [2, 1, 0], [2, 2, 0]])
-        self.n_observations = len(self.observations)
+        self.observations = index.observations
+        self.n_observations = index.n_observations
 
         # the set of possible interventions
-        self.interventions = np.array([0, 0, 0, 0,
-                                       1, 1, 2, 2,
-                                       1, 1, 2, 2])
-        self.n_interventions = len(np.unique(self.interventions))
-        self.unique_interventions = [3, 9, 11]
+        self.interventions = index.interventions
+        self.n_interventions = index.n_interventions
+        self.unique_interventions = index.unique_interventions
+
+        # segment index grouping observations by intervention
+        self.intervention_order = index.intervention_order
+        self.intervention_starts = index.intervention_starts
 
         # initialize priors and posteriors
         self.learner_prior = 1 / self.n_hyp * \
@@ -42,14 +42,10 @@ class GraphSelfTeacher:
     def likelihood(self):
         """Calculate p(d|h, i)"""
 
-        lik = np.zeros((self.n_hyp,
-                        self.n_observations))
-
-        for i, h in enumerate(self.hyp):
-            lik[i] = h.likelihood()
+        lik = graph_likelihood.cached_likelihood(self.hyp)
 
-        # the likelihood should sum to 3.0
-        assert np.allclose(np.sum(lik, axis=1), 3.0)
+        # the likelihood should sum to the number of interventions
+        assert np.allclose(np.sum(lik, axis=1), self.n_interventions)
 
         return lik
 
@@ -59,7 +55,8 @@ class GraphSelfTeacher:
         denom = np.sum(self.learner_posterior, axis=0)
 
         self.learner_posterior = np.divide(
-            self.learner_posterior, denom, where=denom != 0)
+            self.learner_posterior, denom,
+            out=np.zeros_like(self.learner_posterior), where=denom != 0)
 
         # check posterior is normalized
         assert np.all(np.logical_or(
@@ -94,31 +91,29 @@ class GraphSelfTeacher:
         return self_teaching_posterior_original
 
     def update_teacher_posterior(self):
-        teacher_posterior = np.zeros((self.n_hyp,
-                                      self.n_observations))
+        """Calculates p(i|h) for every hypothesis and observation"""
+        return self.update_intervention_posterior()[self.interventions].T
 
+    def update_intervention_posterior(self):
+        """Calculates p(i|h) with one row per intervention"""
         lik = self.likelihood()
 
-        for i in range(self.n_interventions):
-            denom = np.sum(lik[:, self.interventions == i] *
-                           self.learner_prior[:, self.interventions == i],
-                           axis=0)
-
-            numer = lik[:, self.interventions == i] * \
-                self.learner_prior[:, self.interventions == i]
+        # learner posterior for every observation
+        numer = lik * self.learner_prior
+        denom = np.sum(numer, axis=0)
+        learner_posterior = np.divide(numer, denom,
+                                      out=np.zeros_like(numer),
+                                      where=denom != 0.0)
 
-            tmp = np.divide(numer, denom, where=denom != 0.0)
-
-            tmp = np.sum(tmp, axis=1)
-            tmp = tmp / np.sum(tmp)
-
-            teacher_posterior[:, self.interventions == i] = np.tile(
-                tmp, (np.sum(self.interventions == i), 1)).T
+        # sum over the observations of each intervention
+        teacher_posterior = utils.segment_sum(
+            learner_posterior.T, self.intervention_order,
+            self.intervention_starts)
+        teacher_posterior = teacher_posterior / \
+            np.sum(teacher_posterior, axis=1, keepdims=True)
 
         # normalize
-        new = (teacher_posterior[:, self.unique_interventions].T /
-               (np.sum(teacher_posterior[:, self.unique_interventions], axis=1))).T
-
-        teacher_posterior = new[:, self.interventions]
+        teacher_posterior = teacher_posterior / \
+            np.sum(teacher_posterior, axis=0)
 
         return teacher_posterior
@@ -1,76 +1,104 @@
+import itertools
 import numpy as np
 import matplotlib.pyplot as plt
+from models import graph_likelihood
 from models import utils
+from models.cooperative_inference import CooperativeInference
+from models.intervention_index import get_intervention_index
 
 
 class GraphTeacher:
-    def __init__(self, graphs):
+    def __init__(self, graphs, ci_method="picard", ci_tol=0.00001,
+                 ci_max_iter=10000, ci_options=None, log_domain=False,
+                 dtype=np.float64, state_decimals=10):
         self.n_hyp = len(graphs)
-        self.actions = np.array([1, 2, 3])
+
+        # observations and interventions shared by all graphs
+        index = get_intervention_index(graphs[0].n_nodes)
+        self.actions = np.arange(1, index.n_actions + 1)
         self.n_actions = len(self.actions)
-        self.observations = np.array([[0, 1, 1], [0, 1, 2],
-                                      [0, 2, 1], [0, 2, 2],
-                                      [1, 0, 1], [1, 0, 2],
-                                      [1, 1, 0], [1, 2, 0],
-                                      [2, 0, 1], [2, 0, 2],
-                                      [2, 1, 0], [2, 2, 0]])
-        self.n_observations = len(self.observations)
-
-        self.interventions = np.array([0, 0, 0, 0,
-                                       1, 1, 2, 2,
-                                       1, 1, 2, 2])
-        self.n_interventions = len(np.unique(self.interventions))
-        self.unique_interventions = [3, 9, 11]
+        self.observations = index.observations
+        self.n_observations = index.n_observations
+
+        self.interventions = index.interventions
+        self.n_interventions = index.n_interventions
+        self.unique_interventions = index.unique_interventions
+        self.first_interventions = index.first_interventions
+
+        # segment index grouping observations by intervention
+        self.intervention_order = index.intervention_order
+        self.intervention_starts = index.intervention_starts
+        self.intervention_counts = index.intervention_counts
 
         self.hyp = graphs
 
-        # prior over graphs
+        # fixed point solver used for cooperative inference, see
+        # models.fixed_point, and the change at every iteration of its
+        # most recent run
+        self.ci_method = ci_method
+        self.ci_tol = ci_tol
+        self.ci_max_iter = ci_max_iter
+        self.ci_options = {} if ci_options is None else ci_options
+        self.ci_trace = []
+
+        # run cooperative inference updates in log space, where dtype can be
+        # float32 without underflow
+        self.log_domain = log_domain
+        self.dtype = dtype
+
+        # prior over graphs, with one row per observation
         self.learner_prior = 1 / self.n_hyp * \
-            np.ones((self.n_hyp, self.n_observations))
+            np.ones((self.n_observations, self.n_hyp))
 
         # prior over teacher actions
         self.teacher_prior = (1 / self.n_actions) * \
-            np.ones((self.n_hyp, self.n_observations))
+            np.ones((self.n_observations, self.n_hyp))
 
-        # initialize posteriors to be over the priors
+        # initialize posteriors to be over the priors, where the teacher
+        # posterior is stored with one row per intervention
         self.learner_posterior = self.learner_prior
         self.teacher_posterior = self.teacher_prior
+        self.intervention_posterior = (1 / self.n_actions) * \
+            np.ones((self.n_interventions, self.n_hyp))
+
+        # learner priors reached by teaching sequences of observations, where
+        # priors that agree to state_decimals are stored once, with the
+        # teacher posterior over interventions and the next prior after
+        # every observation of each
+        self.state_decimals = state_decimals
+        self.sequential_states = []
+        self.sequential_state_keys = {}
+        self.sequential_intervention_posteriors = {}
+        self.sequential_transitions = {}
 
     def likelihood(self):
-        """Calculates p(d|h, i)"""
-
-        self.lik = np.zeros((self.n_hyp,
-                             self.n_observations))
-
-        for i, h in enumerate(self.hyp):
-            self.lik[:, i] = h.likelihood()
+        """Calculates p(d|h, i) with one row per observation"""
 
-        assert np.isclose(np.sum(self.lik), 36.0)
+        self.lik = graph_likelihood.cached_likelihood(self.hyp).T
 
-    def update_teacher_posterior(self, prior):
-        """Calculates p(i|h)"""
-        teacher_posterior = np.zeros((self.n_hyp, self.n_observations))
-
-        for i in range(self.n_interventions):
-            denom = np.sum(self.lik[self.interventions == i] *
-                           prior[self.interventions == i], axis=1)
-
-            tmp = ((self.lik[self.interventions == i] *
-                    prior[self.interventions == i]).T / denom).T
+        assert np.isclose(np.sum(self.lik), self.n_hyp * self.n_interventions)
 
-            tmp = np.sum(tmp, axis=0)
-            tmp = tmp / np.sum(tmp)
+    def expand(self, teacher_posterior):
+        """Expands a posterior over interventions to every observation"""
+        return teacher_posterior[..., self.interventions, :]
 
-            teacher_posterior[self.interventions == i, :] = np.tile(
-                tmp, (np.sum(self.interventions == i), 1))
+    def intervention_sum(self, values):
+        """Sums rows of values over the observations of each intervention"""
+        return utils.segment_sum(values, self.intervention_order,
+                                 self.intervention_starts, axis=-2)
 
-        # normalize
-        new = teacher_posterior[self.unique_interventions] / \
-            np.sum(teacher_posterior[self.unique_interventions], axis=0)
+    def update_teacher_posterior(self, prior):
+        """Calculates p(i|h) for every observation, for a single prior or a
+        stack of priors"""
+        return self.expand(self.update_intervention_posterior(prior))
 
-        assert np.isclose(np.sum(new), 12.0)
+    def update_intervention_posterior(self, prior):
+        """Calculates p(i|h) with one row per intervention"""
+        teacher_posterior = self.create_cooperative_inference() \
+            .initial_teacher_posterior(prior)
 
-        teacher_posterior = new[self.interventions]
+        assert np.allclose(np.sum(teacher_posterior, axis=(-2, -1)),
+                           self.n_hyp)
 
         # run cooperative inference
         teacher_posterior = self.cooperative_inference(
@@ -79,78 +107,173 @@ class GraphTeacher:
         return teacher_posterior
 
     def update_sequential_teacher_posterior(self):
-        # calculate updated prior
+        # calculate updated prior after each intervention
+        prior_two = self.intervention_sum(self.learner_posterior)
+        prior_two = prior_two / np.sum(prior_two, axis=-1, keepdims=True)
         self.sequential_prior = np.zeros((self.n_interventions,
-                                          self.n_hyp,
-                                          self.n_observations))
-        self.sequential_teacher_posterior = np.zeros((self.n_interventions,
-                                                      self.n_hyp,
-                                                      self.n_observations))
-
-        for i in range(self.n_interventions):
-            prior_two = np.sum(
-                self.learner_posterior[self.interventions == i], axis=0)
-            prior_two = prior_two / np.sum(prior_two)
-            self.sequential_prior[i] = np.tile(
-                prior_two, (self.n_observations, 1))
-
-            self.sequential_teacher_posterior[i] = self.update_teacher_posterior(
-                self.sequential_prior[i])
-            self.sequential_teacher_posterior[i] = self.cooperative_inference(
-                self.sequential_teacher_posterior[i], self.sequential_prior[i])
+                                          self.n_observations,
+                                          self.n_hyp))
+        self.sequential_prior[:] = prior_two[:, None]
+
+        # run cooperative inference for all priors together
+        teacher_posterior = self.update_intervention_posterior(
+            self.sequential_prior)
+        self.sequential_intervention_posterior = self.cooperative_inference(
+            teacher_posterior, self.sequential_prior)
+
+        self.sequential_teacher_posterior = self.expand(
+            self.sequential_intervention_posterior)
+
+    def add_sequential_state(self, prior):
+        """Finds the index of a learner prior, adding it if no stored prior
+        agrees with it"""
+        key = (np.round(prior, self.state_decimals) + 0.0).tobytes()
+        if key not in self.sequential_state_keys:
+            self.sequential_state_keys[key] = len(self.sequential_states)
+            self.sequential_states.append(prior)
+
+        return self.sequential_state_keys[key]
+
+    def update_sequential_posterior(self, n_steps):
+        """Calculates p(i|h) for every learner prior reached by teaching up to
+        n_steps observations, where the teacher at each step runs cooperative
+        inference from the learner posterior after the previous observations.
+        Histories that lead to the same prior share its state, so cooperative
+        inference runs once per distinct state and level, and states from
+        earlier calls are reused"""
+        frontier = [self.add_sequential_state(self.learner_prior[0])]
+
+        for step in range(n_steps):
+            # teacher posteriors of new states, run together
+            missing = [state for state in frontier
+                       if state not in self.sequential_intervention_posteriors]
+            if missing:
+                states = np.array([self.sequential_states[state]
+                                   for state in missing])
+                priors = np.broadcast_to(
+                    states[:, None],
+                    (len(missing), self.n_observations, self.n_hyp))
+                teacher_posterior = self.create_cooperative_inference() \
+                    .initial_teacher_posterior(priors)
+                teacher_posterior = self.cooperative_inference(
+                    teacher_posterior, priors)
+                for state, posterior in zip(missing, teacher_posterior):
+                    self.sequential_intervention_posteriors[state] = posterior
+
+            if step == n_steps - 1:
+                break
+
+            # learner posterior after every observation of new states, where
+            # observations no graph predicts lead nowhere
+            missing = [state for state in frontier
+                       if state not in self.sequential_transitions]
+            if missing:
+                priors = np.array([self.sequential_states[state]
+                                   for state in missing])
+                teacher_posterior = self.expand(np.array(
+                    [self.sequential_intervention_posteriors[state]
+                     for state in missing]))
+                posterior = self.lik * teacher_posterior * priors[:, None]
+                denom = np.sum(posterior, axis=-1, keepdims=True)
+                posterior = np.divide(posterior, denom,
+                                      out=np.zeros_like(posterior),
+                                      where=denom != 0)
+                for state, rows, denoms in zip(missing, posterior, denom):
+                    self.sequential_transitions[state] = np.array(
+                        [self.add_sequential_state(row) if d != 0 else -1
+                         for row, d in zip(rows, denoms[:, 0])])
+
+            frontier = sorted({next_state for state in frontier
+                               for next_state in
+                               self.sequential_transitions[state]
+                               if next_state >= 0})
+
+    def history_likelihood(self, histories):
+        """Calculates p(i_1, d_1, ..., i_k, d_k|h) of teaching each sequence
+        of observations, given as rows of observation indices"""
+        histories = np.atleast_2d(histories)
+        n_histories, n_steps = histories.shape
+        self.update_sequential_posterior(n_steps)
+
+        n_states = len(self.sequential_states)
+        intervention_posteriors = np.zeros((n_states, self.n_interventions,
+                                            self.n_hyp))
+        for state, posterior in \
+                self.sequential_intervention_posteriors.items():
+            intervention_posteriors[state] = posterior
+        transitions = -np.ones((n_states, self.n_observations), dtype=int)
+        for state, next_states in self.sequential_transitions.items():
+            transitions[state] = next_states
+
+        # follow every history through the states
+        states = np.zeros(n_histories, dtype=int)
+        lik = np.ones((n_histories, self.n_hyp))
+        for step in range(n_steps):
+            obs = histories[:, step]
+            teacher_posterior = intervention_posteriors[
+                states, self.interventions[obs]]
+            lik = np.where((states >= 0)[:, None],
+                           lik * teacher_posterior * self.lik[obs], 0.0)
+            states = np.where(states >= 0, transitions[states, obs], -1)
+
+        return lik
+
+    def sequential_teacher_likelihood(self, n_steps):
+        """Calculates p(i_1, d_1, ..., i_k, d_k|h) of every sequence of k
+        observations for k up to n_steps, with one axis per step"""
+        teach = []
+        for k in range(1, n_steps + 1):
+            histories = np.array(list(itertools.product(
+                range(self.n_observations), repeat=k)))
+            teach.append(self.history_likelihood(histories).reshape(
+                (self.n_observations,) * k + (self.n_hyp,)))
 
-    def cooperative_inference(self, teacher_posterior, prior):
-        """Run cooperative inference"""
-
-        crit = 0.00001
-        teacher_posterior_prev = np.zeros_like(teacher_posterior)
-        teacher_posterior = teacher_posterior.copy()
-
-        while np.sum(np.absolute(teacher_posterior - teacher_posterior_prev)) > crit:
-            teacher_posterior_prev = teacher_posterior.copy()
-            teacher_posterior = self.f(teacher_posterior, prior)
-
-            new = teacher_posterior[self.unique_interventions] / \
-                np.sum(teacher_posterior[self.unique_interventions], axis=0)
-            teacher_posterior = new[self.interventions]
-
-        return teacher_posterior
-
-    def f(self, teacher_posterior, prior):
-        for i in range(self.n_interventions):
-            denom = np.sum(teacher_posterior[self.interventions == i] *
-                           self.lik[self.interventions == i] *
-                           prior[self.interventions == i], axis=1)
+        return teach
 
-            tmp = ((teacher_posterior[self.interventions == i] *
-                    prior[self.interventions == i]).T / denom).T
+    def create_cooperative_inference(self):
+        """Creates the cooperative inference engine for the graphs, where
+        the learner leaves the likelihood out of the numerator and the
+        teacher is normalized over graphs before interventions"""
+        return CooperativeInference(
+            self.lik, self.interventions, likelihood_in_numerator=False,
+            normalize_teacher_over_hyps=True, method=self.ci_method,
+            tol=self.ci_tol, max_iter=self.ci_max_iter,
+            options=self.ci_options, log_domain=self.log_domain,
+            dtype=self.dtype)
 
-            tmp = np.sum(tmp, axis=0)
-            tmp = tmp / np.sum(tmp)
-            teacher_posterior[self.interventions == i, :] = \
-                np.tile(tmp, (np.sum(self.interventions == i), 1))
+    def cooperative_inference(self, teacher_posterior, prior):
+        """Run cooperative inference on a teacher posterior with one row per
+        intervention, or on a stack of them with a prior for each"""
+        ci = self.create_cooperative_inference()
+        teacher_posterior, _ = ci.run(teacher_posterior, prior)
+        self.ci_trace = ci.trace
 
-        teacher_posterior = (teacher_posterior.T /
-                             np.sum(teacher_posterior, axis=1)).T
         return teacher_posterior
 
     def update_learner_posterior(self):
-        self.teacher_posterior = self.update_teacher_posterior(
+        self.intervention_posterior = self.update_intervention_posterior(
             self.learner_prior)
+        self.teacher_posterior = self.expand(self.intervention_posterior)
         posterior = self.lik * self.teacher_posterior * self.learner_prior
         self.learner_posterior = (posterior.T / np.sum(posterior, axis=1)).T
         assert np.allclose(np.sum(self.learner_posterior, axis=1), 1.0)
 
-    def teacher_likelihood(self, likelihood_one, likelihood_two):
-        ex_num = [0, 4, 6]
-        cause_num = [0, 3, 6]
-        teach = np.zeros((len(cause_num), len(ex_num), len(ex_num)))
-
-        for i, cause in enumerate(cause_num):
-            for j, ex_one in enumerate(ex_num):
-                for k, ex_two in enumerate(ex_num):
-                    teach[i, j, k] = likelihood_one[ex_one, cause] * \
-                        likelihood_two[j, ex_two, cause]
+    def teacher_likelihood(self, likelihood_one, likelihood_two,
+                           graph_kinds=None):
+        """Calculates the probability of teaching every pair of
+        interventions, for the first graph of each kind. Unless given, the
+        kinds are the orbits of graphs that relabel each other, such as the
+        common cause, common effect and causal chain graphs"""
+        if graph_kinds is None:
+            orbit, _ = graph_likelihood.orbits(self.hyp)
+            graph_kinds = np.unique(orbit)
+
+        ex_num = self.first_interventions
+        cause_num = list(graph_kinds)
+
+        # teach[i, j, k] = p(j|h_i) * p(k|h_i, j)
+        teach = likelihood_one[ex_num][:, cause_num].T[:, :, None] * \
+            likelihood_two[:, ex_num][..., cause_num].transpose(2, 0, 1)
 
         return teach
 
@@ -0,0 +1,375 @@
+import abc
+import numpy as np
+
+
+class IntervalHypSpace(abc.ABC):
+    """Hypothesis space of concepts that are a single run of positive
+    features [start, end), computed from the hypothesis index on demand"""
+
+    def __init__(self, n_features, n_hyp):
+        assert n_features > 0
+
+        self.n_features = n_features
+        self.n_hyp = n_hyp
+        self.shape = (self.n_hyp, self.n_features)
+
+    @abc.abstractmethod
+    def intervals(self, rows):
+        """Calculates the [start, end) run of each hypothesis index"""
+
+    @abc.abstractmethod
+    def interval_index(self, start, end):
+        """Calculates the hypothesis index of the run [start, end)"""
+
+    def rows(self, key):
+        """Converts a row key into an array of hypothesis indices"""
+        if isinstance(key, slice):
+            return np.arange(*key.indices(self.n_hyp))
+
+        rows = np.asarray(key)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = np.where(rows < 0, rows + self.n_hyp, rows)
+
+        if np.any((rows < 0) | (rows >= self.n_hyp)):
+            raise IndexError("hypothesis index out of range")
+
+        return rows
+
+    def __len__(self):
+        return self.n_hyp
+
+    def __iter__(self):
+        for i in range(self.n_hyp):
+            yield self[i]
+
+    def __getitem__(self, key):
+        """Returns dense rows, or labels of a subset of features when indexed
+        as hyp_space[rows, features]"""
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        row_key, feature_key = key
+
+        starts, ends = self.intervals(self.rows(row_key))
+        features = np.arange(self.n_features)[feature_key]
+
+        # broadcast hypotheses against features
+        if np.ndim(features) > 0:
+            starts = starts[..., None]
+            ends = ends[..., None]
+
+        return ((starts <= features) & (features < ends)).astype(int)
+
+    def __array__(self, dtype=None, copy=None):
+        hyps = self[:]
+        return hyps if dtype is None else hyps.astype(dtype)
+
+    def column(self, feature):
+        """Calculates the label every hypothesis assigns to a feature"""
+        return self[:, feature]
+
+    def index(self, hyp):
+        """Finds the index of a hypothesis from its positive features"""
+        hyp = np.asarray(hyp)
+        positive = np.flatnonzero(hyp)
+
+        if len(hyp) != self.n_features:
+            raise ValueError("hypothesis has the wrong number of features")
+
+        if len(positive) == 0:
+            start, end = 0, 0
+        else:
+            start, end = positive[0], positive[-1] + 1
+
+        if end - start != len(positive):
+            raise ValueError("hypothesis is not in the hypothesis space")
+
+        return self.interval_index(start, end)
+
+
+class LineHypSpace(IntervalHypSpace):
+    """Lines ordered by length and then by starting feature, matching
+    utils.create_line_hyp_space"""
+
+    def __init__(self, n_features):
+        n_hyp = n_features * (n_features + 1) // 2
+        super().__init__(n_features, n_hyp)
+
+    def offset(self, lengths):
+        """Calculates the index of the first line of each length"""
+        m = lengths - 1
+        return m * (2 * self.n_features + 1 - m) // 2
+
+    def intervals(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        n = self.n_features
+
+        # invert the offsets of each length, then correct rounding errors
+        m = np.floor(((2 * n + 1) -
+                      np.sqrt((2 * n + 1) ** 2 - 8 * rows)) / 2)
+        lengths = m.astype(np.int64) + 1
+        lengths = np.where(self.offset(lengths + 1) <= rows,
+                           lengths + 1, lengths)
+        lengths = np.where(self.offset(lengths) > rows,
+                           lengths - 1, lengths)
+
+        starts = rows - self.offset(lengths)
+        return starts, starts + lengths
+
+    def interval_index(self, start, end):
+        if not 0 <= start < end <= self.n_features:
+            raise ValueError("hypothesis is not in the hypothesis space")
+
+        return int(self.offset(end - start) + start)
+
+
+class BoundaryHypSpace(IntervalHypSpace):
+    """Boundaries ordered by the number of negative features, matching
+    utils.create_boundary_hyp_space"""
+
+    def __init__(self, n_features):
+        super().__init__(n_features, n_features + 1)
+
+    def intervals(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        ends = self.n_features - rows
+        return np.zeros_like(ends), ends
+
+    def interval_index(self, start, end):
+        if start != 0:
+            raise ValueError("hypothesis is not in the hypothesis space")
+
+        return self.n_features - end
+
+
+class HypothesisSpace:
+    """Concept hypothesis space together with indexes that are computed once
+    and shared by every model using it, see utils.get_hyp_space"""
+
+    def __init__(self, hyps, hyp_space_type=None):
+        self.hyps = hyps
+        self.hyp_space_type = hyp_space_type
+        self.n_hyp, self.n_features = hyps.shape
+        self.n_labels = 2
+        self.shape = (self.n_hyp, self.n_features)
+
+        # shared between models, so protect dense hypotheses from writes
+        if isinstance(self.hyps, np.ndarray):
+            self.hyps.flags.writeable = False
+
+        # hash index from hypothesis to row, unless it can be calculated
+        self.hyp_index = None
+        if not hasattr(self.hyps, "index"):
+            self.hyp_index = {self.key(hyp): i
+                              for i, hyp in enumerate(self.hyps)}
+
+        # deterministic likelihood p(y|x, h), created on first use
+        self.lik = None
+
+        # weighted sums over hypotheses need the dense likelihood, unless
+        # they follow from the runs of lines and boundaries or packed words
+        self.dense_sums = hyp_space_type not in ("boundary", "line") and \
+            not hasattr(self.hyps, "weighted_column_sums")
+
+        # [start, end) run of features labelled positive by each line,
+        # created on first use
+        self.starts = None
+        self.ends = None
+
+        # rows labelled positive and negative by each feature
+        self.positive_rows = None
+        self.negative_rows = None
+        if isinstance(self.hyps, np.ndarray):
+            self.build_feature_index()
+
+    def key(self, hyp):
+        """Converts a hypothesis into a hashable key"""
+        return np.asarray(hyp, dtype=np.uint8).tobytes()
+
+    def build_feature_index(self):
+        """Precomputes the rows labelled positive and negative by each
+        feature"""
+        columns = [self.column(x) for x in range(self.n_features)]
+        self.positive_rows = [np.flatnonzero(column == 1)
+                              for column in columns]
+        self.negative_rows = [np.flatnonzero(column == 0)
+                              for column in columns]
+
+    def index(self, hyp):
+        """Finds the row of a hypothesis"""
+        if self.hyp_index is None:
+            return self.hyps.index(hyp)
+
+        return self.hyp_index[self.key(hyp)]
+
+    def label_rows(self, feature, label):
+        """Finds the rows of all hypotheses giving feature this label"""
+        if self.positive_rows is None:
+            self.build_feature_index()
+
+        if label == 1:
+            return self.positive_rows[feature]
+        else:
+            return self.negative_rows[feature]
+
+    def column(self, feature):
+        """Calculates the label every hypothesis assigns to a feature"""
+        return self.hyps[:, feature]
+
+    def likelihood(self):
+        """Calculates the likelihood p(y|x, h) of observing all possible
+        feature/label pairs, which is shared read-only between models"""
+        if self.lik is None:
+            labels = np.arange(self.n_labels)
+            lik = (np.asarray(self.hyps)[:, :, None] == labels).astype(float)
+            lik.flags.writeable = False
+            self.lik = lik
+
+        return self.lik
+
+    def intervals(self, rows=None):
+        """Finds the [start, end) run of features each line or boundary
+        labels positive"""
+        if self.starts is None:
+            if isinstance(self.hyps, np.ndarray):
+                # read the runs off the dense hypotheses, in any order
+                nonempty = self.hyps.any(axis=1)
+                starts = np.argmax(self.hyps, axis=1)
+                ends = self.n_features - np.argmax(self.hyps[:, ::-1], axis=1)
+                self.starts = np.where(nonempty, starts, 0)
+                self.ends = np.where(nonempty, ends, 0)
+            else:
+                # packed hypotheses keep the order of the implicit space
+                implicit = self.hyps if hasattr(self.hyps, "intervals") else \
+                    create_implicit_hyp_space(self.hyp_space_type,
+                                              self.n_features)
+                self.starts, self.ends = implicit.intervals(
+                    np.arange(self.n_hyp))
+
+        if rows is None:
+            return self.starts, self.ends
+
+        return self.starts[rows], self.ends[rows]
+
+    def weighted_column_sums(self, weights, label=1, rows=None):
+        """Calculates sum_h weights[h] over the hypotheses giving each
+        feature this label, in linear time for lines and boundaries. If rows
+        is given, weights are over that subset of hypotheses"""
+        if self.hyp_space_type == "boundary":
+            if rows is None:
+                rows = np.arange(self.n_hyp)
+
+            # hypothesis i labels the features x < n_features - i positive,
+            # so those rows come first among the sorted rows
+            features = np.arange(self.n_features)
+            n_positive = np.searchsorted(rows, self.n_features - features)
+            if label == 1:
+                prefix = np.concatenate([[0], np.cumsum(weights)])
+                return prefix[n_positive]
+            else:
+                suffix = np.concatenate([np.cumsum(weights[::-1])[::-1], [0]])
+                return suffix[n_positive]
+
+        if self.hyp_space_type == "line":
+            starts, ends = self.intervals(rows)
+            n_bins = self.n_features + 1
+            first = np.bincount(starts, weights, n_bins)
+            last = np.bincount(ends, weights, n_bins)
+            if label == 1:
+                # difference array over the runs, where cancellation leaves
+                # round-off at features no weighted run covers
+                sums = np.cumsum(first - last)[:-1]
+                weighted = weights != 0
+                covered = np.cumsum(
+                    np.bincount(starts[weighted], minlength=n_bins) -
+                    np.bincount(ends[weighted], minlength=n_bins))[:-1]
+                return np.where(covered > 0, sums, 0)
+            else:
+                # runs starting after the feature or ending at or before it
+                after = np.cumsum(first[::-1])[::-1]
+                return after[1:] + np.cumsum(last)[:-1]
+
+        if hasattr(self.hyps, "weighted_column_sums"):
+            return self.hyps.weighted_column_sums(weights, label, rows)
+
+        lik = self.likelihood()
+        if rows is not None:
+            lik = lik[rows]
+        return np.dot(weights, lik[:, :, label])
+
+    def weighted_row_sums(self, values, label=1, rows=None):
+        """Calculates sum_x values[x] over the features each hypothesis gives
+        this label, in linear time for lines and boundaries. If rows is given,
+        only those hypotheses are returned"""
+        if self.hyp_space_type == "boundary":
+            if rows is None:
+                rows = np.arange(self.n_hyp)
+            ends = self.n_features - rows
+            if label == 1:
+                prefix = np.concatenate([[0], np.cumsum(values)])
+                return prefix[ends]
+            else:
+                suffix = np.concatenate([np.cumsum(values[::-1])[::-1], [0]])
+                return suffix[ends]
+
+        if self.hyp_space_type == "line":
+            starts, ends = self.intervals(rows)
+            prefix = np.concatenate([[0], np.cumsum(values)])
+            if label == 1:
+                # prefix differences, exactly zero over runs of zero values
+                sums = prefix[ends] - prefix[starts]
+                nonzero = np.concatenate([[0], np.cumsum(values != 0)])
+                return np.where(nonzero[ends] > nonzero[starts], sums, 0)
+            else:
+                suffix = np.concatenate([np.cumsum(values[::-1])[::-1], [0]])
+                return prefix[starts] + suffix[ends]
+
+        if hasattr(self.hyps, "weighted_row_sums"):
+            return self.hyps.weighted_row_sums(values, label, rows)
+
+        lik = self.likelihood()
+        if rows is not None:
+            lik = lik[rows]
+        return np.dot(lik[:, :, label], values)
+
+    def mask_posterior(self, posterior, features, labels, rows=None):
+        """Zeros out the hypotheses inconsistent with observing labels for
+        features and renormalizes the posterior, with packed masks when
+        available. If rows is given, the posterior is over that subset of
+        hypotheses"""
+        if hasattr(self.hyps, "mask_posterior"):
+            return self.hyps.mask_posterior(posterior, features, labels, rows)
+
+        consistent = np.ones(len(posterior), dtype=bool)
+        for x, y in zip(features, labels):
+            column = self.column(x)
+            consistent &= (column if rows is None else column[rows]) == y
+
+        posterior = posterior * consistent
+        if np.sum(posterior) != 0:
+            return posterior / np.sum(posterior)
+        else:
+            return posterior
+
+    def __len__(self):
+        return self.n_hyp
+
+    def __iter__(self):
+        return iter(self.hyps)
+
+    def __getitem__(self, key):
+        return self.hyps[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.hyps, dtype=dtype)
+
+
+def create_implicit_hyp_space(hyp_space_type, n_features):
+    """Creates an implicit hypothesis space of lines or boundaries"""
+    if hyp_space_type == "boundary":
+        return BoundaryHypSpace(n_features)
+    elif hyp_space_type == "line":
+        return LineHypSpace(n_features)
+    else:
+        raise ValueError(
+            "Unknown hypothesis space type: {}".format(hyp_space_type))
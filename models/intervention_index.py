@@ -0,0 +1,73 @@
+import functools
+import numpy as np
+from models import utils
+
+
+class InterventionIndex:
+    """Enumerates every observation of a graph with n_nodes after an
+    intervention on a single node. Observations are coded per node as
+    0 = intervened, 1 = observed off and 2 = observed on, and are listed in
+    the order of counting in base 3, as in increment_variable_base_vec.m"""
+
+    def __init__(self, n_nodes):
+        assert n_nodes > 0
+
+        self.n_nodes = n_nodes
+        self.n_actions = n_nodes
+
+        # off/on states of the other nodes, with the intervened node
+        # inserted as a column of zeros
+        states = (np.arange(2 ** (n_nodes - 1))[:, None] >>
+                  np.arange(n_nodes - 2, -1, -1)) & 1
+        observations = np.concatenate(
+            [np.insert(states + 1, node, 0, axis=1)
+             for node in range(n_nodes)]).astype(np.int8)
+
+        # sort by the base 3 code of every observation
+        self.radix = 3 ** np.arange(n_nodes - 1, -1, -1)
+        codes = observations.astype(np.int64) @ self.radix
+        order = np.argsort(codes)
+        self.codes = codes[order]
+        self.observations = observations[order]
+        self.n_observations = len(self.observations)
+
+        # the intervened node of every observation
+        self.interventions = np.argmin(self.observations, axis=1)
+        self.n_interventions = n_nodes
+
+        # segment index grouping observations by intervention, with the
+        # first and last observation of every intervention
+        self.intervention_order, self.intervention_starts = \
+            utils.create_segment_index(self.interventions)
+        self.intervention_counts = np.bincount(self.interventions)
+        self.first_interventions = self.intervention_order[
+            self.intervention_starts]
+        self.unique_interventions = self.intervention_order[
+            self.intervention_starts + self.intervention_counts - 1]
+
+        # the index is shared by all graphs, so its tables are read only
+        for table in [self.codes, self.observations, self.interventions]:
+            table.setflags(write=False)
+
+    def __len__(self):
+        return self.n_observations
+
+    def index(self, observations):
+        """Finds the row of an observation, or of every row of an array of
+        observations"""
+        codes = np.asarray(observations) @ self.radix
+        rows = np.searchsorted(self.codes, codes)
+        assert np.all(self.codes[np.minimum(rows, len(self) - 1)] == codes)
+        return rows
+
+    def intervention(self, observations):
+        """Finds the intervened node of an observation, or of every row of an
+        array of observations"""
+        return self.interventions[self.index(observations)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_intervention_index(n_nodes):
+    """Gets the InterventionIndex for a number of nodes, which is created
+    once and shared by every later call"""
+    return InterventionIndex(n_nodes)
@@ -0,0 +1,57 @@
+import numpy as np
+from models import graph_likelihood
+from models.cooperative_inference import CooperativeInference
+
+
+def intervention_groups(observations):
+    """Groups observations by their intervened nodes, numbering the groups
+    in order of first appearance as in pDH_bnet.m"""
+    _, first, groups = np.unique(np.asarray(observations) == 0, axis=0,
+                                 return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order))
+    return ranks[np.ravel(groups)]
+
+
+def likelihood(graphs, observations):
+    """Calculates p(d|h, i) with one row per observation and one column per
+    graph, as in pDH_bnet.m"""
+    return graph_likelihood.likelihood(graphs, observations).T
+
+
+def like_ped_sampling(prior, lik, rho=1.0, extension=False, tol=0.00001,
+                      max_iter=10000, method="picard", options=None):
+    """Runs pedagogical sampling from likePedSampling.m, iterating
+    p(d|h) \\propto p(h|d)^rho from the likelihood of examples (rows) for each
+    hypothesis (columns) to a fixed point. A stack of priors over hypotheses
+    runs as a batch. extension is kept for parity with the reference, which
+    never reads it"""
+    ci = CooperativeInference(np.ones_like(lik), np.arange(len(lik)),
+                              rho=rho, method=method, tol=tol,
+                              max_iter=max_iter, options=options)
+
+    prior = np.asarray(prior)[..., None, :]
+    teacher_posterior = np.broadcast_to(lik, prior.shape[:-2] + lik.shape)
+    teacher_posterior, _ = ci.run(teacher_posterior, prior)
+
+    return teacher_posterior
+
+
+def causal_ped_sampling(prior, lik, interventions, rho=1.0, tol=0.00001,
+                        max_iter=10000, method="picard", options=None):
+    """Runs pedagogical sampling of interventions from pDH_bnet.m and
+    computeLikelihood.m, returning p(i|h) and p(h|d, i) for every
+    observation. A stack of priors over graphs runs as a batch"""
+    ci = CooperativeInference(lik, interventions,
+                              likelihood_in_numerator=False,
+                              normalize_teacher_over_hyps=True, rho=rho,
+                              method=method, tol=tol, max_iter=max_iter,
+                              options=options)
+
+    # start from a learner that assumes interventions are chosen uniformly
+    prior = np.asarray(prior)[..., None, :]
+    teacher_posterior = ci.initial_teacher_posterior(prior)
+    teacher_posterior, learner_posterior = ci.run(teacher_posterior, prior)
+
+    return ci.expand(teacher_posterior), learner_posterior
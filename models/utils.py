@@ -1,99 +1,255 @@
+import functools
+import itertools
 import numpy as np
 from models import dag
+from models import bitset_hyp_space
+from models import hypothesis_space
 
 
 def create_line_hyp_space(n_features):
     """Creates a hypothesis space of concepts defined by 1D lines"""
-    hyp_space = []
-    for i in range(1, n_features + 1):
-        for j in range(n_features - i + 1):
-            hyp = [0 for _ in range(n_features)]
-            hyp[j:j + i] = [1 for _ in range(i)]
-            hyp_space.append(hyp)
-    hyp_space = np.array(hyp_space)
-    return hyp_space
+    return np.asarray(hypothesis_space.LineHypSpace(n_features))
 
 
 def create_boundary_hyp_space(n_features):
     """Creates a hypothesis space of concepts defined by a linear boundary"""
-    hyp_space = []
-    for i in range(n_features + 1):
-        hyp = [1 for _ in range(n_features)]
-        hyp[n_features-i:n_features] = [0 for _ in range(i)]
-        hyp_space.append(hyp)
-    hyp_space = np.array(hyp_space)
+    return np.asarray(hypothesis_space.BoundaryHypSpace(n_features))
+
+
+def create_hyp_space(hyp_space_type, n_features, backend="dense"):
+    """Creates a concept hypothesis space, either as a dense matrix, packed
+    into bitsets, or implicitly computed from each hypothesis' parameters"""
+    if backend == "dense":
+        return np.asarray(hypothesis_space.create_implicit_hyp_space(
+            hyp_space_type, n_features))
+    elif backend == "bitset":
+        return bitset_hyp_space.create_bitset_hyp_space(hyp_space_type,
+                                                        n_features)
+    elif backend == "implicit":
+        return hypothesis_space.create_implicit_hyp_space(hyp_space_type,
+                                                          n_features)
+    else:
+        raise ValueError("Unknown backend: {}".format(backend))
+
+
+@functools.lru_cache(maxsize=None)
+def get_hyp_space(hyp_space_type, n_features, backend="dense"):
+    """Gets the HypothesisSpace for a concept type and number of features,
+    which is created once and shared by every later call"""
+    hyps = create_hyp_space(hyp_space_type, n_features, backend)
+    return hypothesis_space.HypothesisSpace(hyps, hyp_space_type)
+
+
+def resolve_hyp_space(n_features=None, hyp_space_type=None, backend="dense",
+                      hyp_space=None):
+    """Gets the hypothesis space of a concept model, which is either given
+    directly, when n_features and hyp_space_type must agree with it if they
+    are given, or looked up by type and number of features, by default
+    boundaries over 3 features"""
+    if hyp_space is None:
+        if n_features is None:
+            n_features = 3
+        if hyp_space_type is None:
+            hyp_space_type = "boundary"
+
+        assert n_features > 0
+        return get_hyp_space(hyp_space_type, n_features, backend)
+
+    if n_features is not None and n_features != hyp_space.n_features:
+        raise ValueError(
+            "n_features {} does not match the hypothesis space with {} "
+            "features".format(n_features, hyp_space.n_features))
+    if hyp_space_type is not None and \
+            hyp_space_type != hyp_space.hyp_space_type:
+        raise ValueError(
+            "hyp_space_type {} does not match the hypothesis space of type "
+            "{}".format(hyp_space_type, hyp_space.hyp_space_type))
+
     return hyp_space
 
 
+def noisy_or_cpd(n_parents, t=0.8, b=0.01):
+    """Creates the noisy-OR table p(x|parents), indexed by the state of each
+    parent and then of x, where every parent that is on causes x with
+    probability t and x is also on with background probability b"""
+    n_on = np.sum(np.indices((2,) * n_parents), axis=0)
+    off = (1 - b) * (1 - t) ** n_on
+    return np.stack([off, 1 - off], axis=-1)
+
+
+def create_noisy_or_cpds(graph, t=0.8, b=0.01):
+    """Creates the noisy-OR table of every node of an adjacency matrix"""
+    return [noisy_or_cpd(n_parents, t, b)
+            for n_parents in np.sum(graph, axis=0)]
+
+
+def enumerate_dags(n_nodes, max_parents=None, connected=False,
+                   unlabelled=False):
+    """Generates the adjacency matrix of every DAG on n_nodes, optionally
+    limiting the number of parents of each node, keeping only weakly
+    connected graphs, or keeping one graph per isomorphism class"""
+    if max_parents is None:
+        max_parents = n_nodes
+
+    # bits of every parent set, so column j of a graph is row parents[j]
+    bits = (np.arange(2 ** n_nodes)[:, None] >> np.arange(n_nodes)) & 1
+
+    seen = set()
+    for parents in _enumerate_parent_sets(n_nodes, max_parents):
+        graph = bits[list(parents)].T.copy()
+
+        if connected and not _is_connected(graph):
+            continue
+
+        if unlabelled:
+            key = canonical_form(graph)
+            if key in seen:
+                continue
+            seen.add(key)
+
+        yield graph
+
+
+def create_dag_hyp_space(n_nodes, t=0.8, b=0.01, **kwargs):
+    """Generates a DirectedGraph with noisy-OR tables for every DAG on
+    n_nodes, see enumerate_dags for the filters in kwargs"""
+    for graph in enumerate_dags(n_nodes, **kwargs):
+        yield dag.DirectedGraph(graph, create_noisy_or_cpds(graph, t, b),
+                                t, b)
+
+
+def canonical_form(graph):
+    """Finds the smallest adjacency matrix, as bytes, over all relabellings
+    of the nodes, which is shared by all isomorphic graphs"""
+    keys, _ = canonical_forms(np.asarray(graph)[None])
+    return keys[0]
+
+
+def canonical_forms(graphs):
+    """Finds the canonical form of every graph in a stack of adjacency
+    matrices, along with a relabelling perm of each graph that gives it,
+    so graph[perm][:, perm] is the canonical graph"""
+    graphs = np.asarray(graphs, dtype=np.uint8)
+    perms = _node_permutations(graphs.shape[-1])
+
+    # every relabelling of every graph, packed into bytes
+    permuted = graphs[:, perms[:, :, None], perms[:, None, :]]
+    packed = np.packbits(permuted.reshape(len(graphs), len(perms), -1),
+                         axis=-1)
+
+    if packed.shape[-1] <= 8:
+        # bytes compare like big endian integers of the same length
+        shifts = 8 * np.arange(packed.shape[-1] - 1, -1, -1, dtype=np.uint64)
+        values = np.sum(packed.astype(np.uint64) << shifts, axis=-1,
+                        dtype=np.uint64)
+        best = np.argmin(values, axis=1)
+    else:
+        best = np.array([min(range(len(perms)),
+                             key=list(map(bytes, graph_packed)).__getitem__)
+                         for graph_packed in packed])
+
+    keys = [bytes(graph_packed[i]) for graph_packed, i in zip(packed, best)]
+    return keys, perms[best]
+
+
+@functools.lru_cache(maxsize=None)
+def _node_permutations(n_nodes):
+    return np.array(list(itertools.permutations(range(n_nodes))))
+
+
+def _mask_to_nodes(mask):
+    return [node for node in range(mask.bit_length()) if mask >> node & 1]
+
+
+def _submasks(mask):
+    """Generates every subset of the bits of mask, including the empty one"""
+    submask = mask
+    while True:
+        yield submask
+        if submask == 0:
+            return
+        submask = (submask - 1) & mask
+
+
+def _enumerate_parent_sets(n_nodes, max_parents):
+    """Generates the parent set of every node of every DAG as bitmasks.
+    Every DAG is built exactly once by peeling off layers of sources, where
+    every node of a layer has a parent in the layer before it and its other
+    parents in earlier layers"""
+    parents = [0] * n_nodes
+
+    def layers(remaining, placed, last):
+        if remaining == 0:
+            yield tuple(parents)
+            return
+
+        for layer in _submasks(remaining):
+            if layer == 0:
+                continue
+
+            nodes = _mask_to_nodes(layer)
+            if last == 0:
+                options = [[0]] * len(nodes)
+            else:
+                options = [[p for p in _submasks(placed)
+                            if p & last and bin(p).count("1") <= max_parents]
+                           ] * len(nodes)
+
+            for parent_sets in itertools.product(*options):
+                for node, parent_set in zip(nodes, parent_sets):
+                    parents[node] = parent_set
+                yield from layers(remaining & ~layer, placed | layer, layer)
+
+    yield from layers((1 << n_nodes) - 1, 0, 0)
+
+
+def _is_connected(graph):
+    """Checks whether a graph is weakly connected"""
+    reach = transitive_closure(graph + graph.T + np.eye(len(graph), dtype=int))
+    return bool(np.all(reach[0]))
+
+
+def transitive_closure(graphs):
+    """Finds which nodes can be reached from every node along directed
+    edges, for an adjacency matrix or a stack of them, by squaring the
+    reachability matrix until it covers paths through every node"""
+    reach = np.asarray(graphs) > 0
+    n_nodes = reach.shape[-1]
+
+    # after k squarings, reach covers paths of up to 2 ** k edges
+    for _ in range(int(np.ceil(np.log2(max(n_nodes - 1, 1))))):
+        reach = reach | (np.matmul(reach.astype(np.int32),
+                                   reach.astype(np.int32)) > 0)
+
+    return reach
+
+
 def create_graph_hyp_space(t=0.8, b=0.01):
     """Creates a dict containing all possible common cause, common effect,
     causal chain and single link graphs, along with their likelihoods"""
 
     # enumerate all graphs with three nodes
     common_cause_1 = np.array([[0, 1, 1], [0, 0, 0], [0, 0, 0]])
-    common_cause_1_cpd = [np.array([1-b, b]),
-                          np.array([[1-b, b], [(1-t)*(1-b), t + (1-t)*b]]),
-                          np.array([[1-b, b], [(1-t)*(1-b), t + (1-t)*b]])]
-
     common_cause_2 = np.array([[0, 0, 0], [1, 0, 1], [0, 0, 0]])
-    common_cause_2_cpd = [common_cause_1_cpd[i] for i in [1, 0, 2]]
-
     common_cause_3 = np.array([[0, 0, 0], [0, 0, 0], [1, 1, 0]])
-    common_cause_3_cpd = [common_cause_1_cpd[i] for i in [1, 2, 0]]
 
     common_effect_1 = np.array([[0, 0, 1], [0, 0, 1], [0, 0, 0]])
-    common_effect_1_cpd = [np.array([1-b, b]),
-                           np.array([1-b, b]),
-                           np.array([[[1-b, b], [(1-t)*(1-b), (t + (1-t)*b)]],
-                                     [[(1-t)*(1-b), (t + (1-t)*b)],
-                                      [(1-t)*(1-b)*(1-t),
-                                       (t)**2 + (t*(1-t))*2 + b*(1-t)**2]]])]
-
     common_effect_2 = np.array([[0, 1, 0], [0, 0, 0], [0, 1, 0]])
-    common_effect_2_cpd = [common_effect_1_cpd[i] for i in [0, 2, 1]]
-
     common_effect_3 = np.array([[0, 0, 0], [1, 0, 0], [1, 0, 0]])
-    common_effect_3_cpd = [common_effect_1_cpd[i] for i in [2, 0, 1]]
 
     causal_chain_1 = np.array([[0, 1, 0], [0, 0, 1], [0, 0, 0]])
-    causal_chain_1_cpd = [np.array([1-b, b]),
-                          np.array([[1-b, b], [(1-t)*(1-b), t + (1-t)*b]]),
-                          np.array([[1-b, b], [(1-t)*(1-b), t + (1-t)*b]])]
-
     causal_chain_2 = np.array([[0, 0, 1], [0, 0, 0], [0, 1, 0]])
-    causal_chain_2_cpd = [causal_chain_1_cpd[i] for i in [0, 2, 1]]
-
     causal_chain_3 = np.array([[0, 0, 0], [0, 0, 1], [1, 0, 0]])
-    causal_chain_3_cpd = [causal_chain_1_cpd[i] for i in [1, 0, 2]]
-
     causal_chain_4 = np.array([[0, 0, 1], [1, 0, 0], [0, 0, 0]])
-    causal_chain_4_cpd = [causal_chain_1_cpd[i] for i in [2, 0, 1]]
-
     causal_chain_5 = np.array([[0, 1, 0], [0, 0, 0], [1, 0, 0]])
-    causal_chain_5_cpd = [causal_chain_1_cpd[i] for i in [1, 2, 0]]
-
     causal_chain_6 = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]])
-    causal_chain_6_cpd = [causal_chain_1_cpd[i] for i in [2, 1, 0]]
 
     single_link_1 = np.array([[0, 1, 0], [0, 0, 0], [0, 0, 0]])
-    single_link_1_cpd = [np.array([1-b, b]),
-                         np.array([[1-b, b], [(1-t)*(1-b), t + (1-t)*b]]),
-                         np.array([1-b, b])]
-
     single_link_2 = np.array([[0, 0, 1], [0, 0, 0], [0, 0, 0]])
-    single_link_2_cpd = [single_link_1_cpd[i] for i in [0, 2, 1]]
-
     single_link_3 = np.array([[0, 0, 0], [1, 0, 0], [0, 0, 0]])
-    single_link_3_cpd = [single_link_1_cpd[i] for i in [1, 0, 2]]
-
     single_link_4 = np.array([[0, 0, 0], [0, 0, 1], [0, 0, 0]])
-    single_link_4_cpd = [single_link_1_cpd[i] for i in [2, 0, 1]]
-
     single_link_5 = np.array([[0, 0, 0], [0, 0, 0], [1, 0, 0]])
-    single_link_5_cpd = [single_link_1_cpd[i] for i in [1, 2, 0]]
-
     single_link_6 = np.array([[0, 0, 0], [0, 0, 0], [0, 1, 0]])
-    single_link_6_cpd = [single_link_1_cpd[i] for i in [2, 1, 0]]
 
     graph_names = ["common_cause_1", "common_cause_2", "common_cause_3",
                    "common_effect_1", "common_effect_2", "common_effect_3",
@@ -109,16 +265,9 @@ def create_graph_hyp_space(t=0.8, b=0.01):
               single_link_1, single_link_2, single_link_3,
               single_link_4, single_link_5, single_link_6]
 
-    cpds = [common_cause_1_cpd, common_cause_2_cpd, common_cause_3_cpd,
-            common_effect_1_cpd, common_effect_2_cpd, common_effect_3_cpd,
-            causal_chain_1_cpd, causal_chain_2_cpd, causal_chain_3_cpd,
-            causal_chain_4_cpd, causal_chain_5_cpd, causal_chain_6_cpd,
-            single_link_1_cpd, single_link_2_cpd, single_link_3_cpd,
-            single_link_4_cpd, single_link_5_cpd, single_link_6_cpd]
-
-    hyp_space = {graph_names: dag.DirectedGraph(graph, cpd, t, b)
-                 for (graph_names, graph, cpd) in
-                 zip(graph_names, graphs, cpds)}
+    hyp_space = {graph_names: dag.DirectedGraph(
+                     graph, create_noisy_or_cpds(graph, t, b), t, b)
+                 for (graph_names, graph) in zip(graph_names, graphs)}
 
     return hyp_space
 
@@ -210,3 +359,49 @@ def create_active_learning_hyp_space(t=0.8, b=0.0):
                                 problem_27_graphs]
 
     return active_learning_problems
+
+
+def create_segment_index(segments):
+    """Sorts items by the segment they belong to, returning the sort order
+    and the position where each segment starts"""
+    segments = np.asarray(segments)
+    order = np.argsort(segments, kind="stable")
+    counts = np.bincount(segments)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return order, starts
+
+
+def segment_sum(values, order, starts, axis=0):
+    """Sums values within each segment along an axis"""
+    return np.add.reduceat(np.take(values, order, axis=axis), starts,
+                           axis=axis)
+
+
+def logsumexp(a, axis=None, keepdims=False):
+    """Calculates log(sum(exp(a))) along an axis without overflow or
+    underflow, keeping the dtype of a"""
+    a_max = np.max(a, axis=axis, keepdims=True)
+    a_max = np.where(np.isfinite(a_max), a_max, 0).astype(a.dtype)
+
+    with np.errstate(divide="ignore"):
+        out = np.log(np.sum(np.exp(a - a_max), axis=axis,
+                            keepdims=True)) + a_max
+
+    if not keepdims:
+        out = np.squeeze(out, axis=axis)
+    return out
+
+
+def segment_logsumexp(values, order, starts, axis=0):
+    """Calculates logsumexp of values within each segment along an axis"""
+    values = np.take(values, order, axis=axis)
+    segments = np.searchsorted(starts, np.arange(values.shape[axis]),
+                               side="right") - 1
+
+    maxes = np.maximum.reduceat(values, starts, axis=axis)
+    maxes = np.where(np.isfinite(maxes), maxes, 0).astype(values.dtype)
+
+    with np.errstate(divide="ignore"):
+        return np.log(np.add.reduceat(
+            np.exp(values - np.take(maxes, segments, axis=axis)), starts,
+            axis=axis)) + maxes
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class VersionSpace:
+    """Hypotheses of a line or boundary space consistent with the observed
+    data, kept as the sorted rows that survive each observation"""
+
+    def __init__(self, hyp_space):
+        assert hyp_space.hyp_space_type in ("boundary", "line")
+
+        self.hyp_space_type = hyp_space.hyp_space_type
+        self.n_features = hyp_space.n_features
+        self.n_hyp = len(hyp_space)
+        self.starts, self.ends = hyp_space.intervals()
+
+        # rows consistent with every observation so far
+        self.survivors = np.arange(self.n_hyp)
+
+    def observe(self, x, y):
+        """Removes the hypotheses inconsistent with observing label y for
+        feature x, checking only the hypotheses that survived so far"""
+        starts = self.starts[self.survivors]
+        ends = self.ends[self.survivors]
+        covered = (starts <= x) & (x < ends)
+        self.survivors = self.survivors[covered == (y == 1)]
+
+    def size(self):
+        """Counts the hypotheses consistent with the observed data"""
+        return len(self.survivors)
+
+    def consistent(self, rows=None):
+        """Calculates which hypotheses are consistent with the observed
+        data, as a mask over rows"""
+        if rows is None:
+            mask = np.zeros(self.n_hyp, dtype=bool)
+            mask[self.survivors] = True
+            return mask
+
+        return np.isin(rows, self.survivors)
+
+    def contains(self, row):
+        """Checks if a hypothesis is consistent with the observed data"""
+        i = np.searchsorted(self.survivors, row)
+        return bool(i < len(self.survivors) and self.survivors[i] == row)
+
+    def posterior(self, prior=None, rows=None):
+        """Calculates the posterior over hypotheses, which is the prior
+        restricted to the consistent hypotheses. If rows is given, the prior
+        and posterior are over that subset of hypotheses"""
+        if prior is None:
+            prior = np.ones(self.n_hyp if rows is None else len(rows))
+
+        posterior = prior * self.consistent(rows)
+        return posterior / np.sum(posterior)
@@ -4,9 +4,8 @@ import ternary
 from models import utils
 from models.concept_active_learner import ConceptActiveLearner
 from models.concept_self_teacher import ConceptSelfTeacher
-from models.graph_active_learner import GraphActiveLearner
 from models.graph_self_teacher import GraphSelfTeacher
-from models.graph_positive_test_strategy import GraphPositiveTestStrategy
+from models.graph_problem_set import GraphProblemSet
 
 
 def run_first_feature_boundary_simulations():
@@ -17,8 +16,7 @@ def run_first_feature_boundary_simulations():
     figure, ax = plt.subplots()
 
     al = ConceptActiveLearner(n_features, hyp_space_type, sampling)
-    active_learning_prob_one = np.array([
-        al.expected_information_gain(x) for x in range(n_features)])
+    active_learning_prob_one = al.batch_expected_information_gain()
 
     # normalize
     active_learning_prob_one = active_learning_prob_one / \
@@ -58,8 +56,7 @@ def run_eight_feature_boundary_simulations():
     figure, ax = plt.subplots()
 
     al = ConceptActiveLearner(n_features, hyp_space_type, sampling)
-    active_learning_prob_one = np.array([
-        al.expected_information_gain(x) for x in range(n_features)])
+    active_learning_prob_one = al.batch_expected_information_gain()
 
     # normalize
     active_learning_prob_one = active_learning_prob_one / \
@@ -108,8 +105,7 @@ def run_second_feature_boundary_simulations():
     for i, (x, y) in enumerate(zip(xs, ys)):
         # get predictions from active learning model
         al = ConceptActiveLearner(n_features, hyp_space_type, sampling)
-        active_learning_prob_one = np.array([
-            al.expected_information_gain(x) for x in range(n_features)])
+        active_learning_prob_one = al.batch_expected_information_gain()
 
         # normalize
         active_learning_prob_one = active_learning_prob_one / \
@@ -117,8 +113,7 @@ def run_second_feature_boundary_simulations():
 
         # perform update
         al.update(x=x, y=y)
-        active_learning_prob_two = np.array([
-            al.expected_information_gain(x) for x in range(n_features)])
+        active_learning_prob_two = al.batch_expected_information_gain()
 
         # normalize
         denom = np.sum(active_learning_prob_two)
@@ -181,8 +176,7 @@ def run_three_feature_line_simulations():
     figure, ax = plt.subplots()
 
     al = ConceptActiveLearner(n_features, hyp_space_type, sampling)
-    active_learning_prob_one = np.array([
-        al.expected_information_gain(x) for x in range(n_features)])
+    active_learning_prob_one = al.batch_expected_information_gain()
 
     # normalize
     active_learning_prob_one = active_learning_prob_one / \
@@ -224,8 +218,7 @@ def run_eight_feature_line_simulations():
     figure, ax = plt.subplots()
 
     al = ConceptActiveLearner(n_features, hyp_space_type, sampling)
-    active_learning_prob_one = np.array([
-        al.expected_information_gain(x) for x in range(n_features)])
+    active_learning_prob_one = al.batch_expected_information_gain()
 
     # normalize
     active_learning_prob_one = active_learning_prob_one / \
@@ -286,24 +279,13 @@ def run_causal_simulations():
     b = 0.0  # background rate
 
     active_learning_problems = utils.create_active_learning_hyp_space(t=t, b=b)
-    ig_model_predictions = []
-    self_teaching_model_predictions = []
-    pts_model_predictions = []
-
-    # get predictions of all three models
-    for i, active_learning_problem in enumerate(active_learning_problems):
-        gal = GraphActiveLearner(active_learning_problem)
-        gal.update_posterior()
-        eig = gal.expected_information_gain().tolist()
-        ig_model_predictions.append(eig)
-
-        gst = GraphSelfTeacher(active_learning_problem)
-        gst.update_learner_posterior()
-        self_teaching_posterior = gst.update_self_teaching_posterior()
-        self_teaching_model_predictions.append(self_teaching_posterior)
+    problem_set = GraphProblemSet.from_problems(active_learning_problems)
 
-        gpts = GraphPositiveTestStrategy(active_learning_problem)
-        pts_model_predictions.append(gpts.positive_test_strategy())
+    # get predictions of all three models for all problems at once
+    ig_model_predictions = problem_set.expected_information_gain().tolist()
+    self_teaching_model_predictions = \
+        problem_set.self_teaching_posterior().tolist()
+    pts_model_predictions = problem_set.positive_test_strategy().tolist()
 
     figure, ax = plt.subplots()
     figure.set_size_inches(16, 5)
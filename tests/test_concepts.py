@@ -2,7 +2,16 @@ import pytest
 import numpy as np
 from models.utils import create_line_hyp_space
 from models.utils import create_boundary_hyp_space
+from models.utils import create_hyp_space
+from models.utils import get_hyp_space
+from models.hypothesis_space import HypothesisSpace
+from models.bitset_hyp_space import popcount
+from models.hypothesis_space import IntervalHypSpace
+from models.hypothesis_space import LineHypSpace
+from models.version_space import VersionSpace
+from models.concept_teacher import ConceptTeacher
 from models.concept_self_teacher import ConceptSelfTeacher
+from models.concept_active_learner import ConceptActiveLearner
 
 
 def test_create_line_hyp_space():
@@ -58,3 +67,350 @@ def test_concept_self_teacher():
     first_feature_prob = np.array([50/154, 54/154, 50/154])
 
     assert np.allclose(first_feature_prob, self_teacher_prob)
+
+
+def test_implicit_hyp_space():
+    n_features = 6
+
+    for hyp_space_type in ["boundary", "line"]:
+        hyp_space = create_hyp_space(hyp_space_type, n_features)
+        implicit_hyp_space = create_hyp_space(
+            hyp_space_type, n_features, backend="implicit")
+
+        assert len(implicit_hyp_space) == len(hyp_space)
+        assert np.array_equal(implicit_hyp_space[-1], hyp_space[-1])
+        assert np.array_equal(implicit_hyp_space[1:5], hyp_space[1:5])
+        assert np.array_equal(implicit_hyp_space[:, 2], hyp_space[:, 2])
+        assert np.array_equal(implicit_hyp_space[[0, 3], 1:4],
+                              hyp_space[[0, 3], 1:4])
+
+        for i, hyp in enumerate(hyp_space):
+            assert implicit_hyp_space.index(hyp) == i
+
+    # only the parameters of each queried hypothesis are computed
+    n_features = 10 ** 4
+    line_hyp_space = LineHypSpace(n_features)
+    last_hyp = line_hyp_space[len(line_hyp_space) - 1]
+
+    assert len(line_hyp_space) == n_features * (n_features + 1) // 2
+    assert np.sum(last_hyp) == n_features
+    assert line_hyp_space.index(last_hyp) == len(line_hyp_space) - 1
+
+    # the base class leaves the interval parameterization to subclasses
+    with pytest.raises(TypeError):
+        IntervalHypSpace(n_features, n_features)
+
+
+def test_hyp_space_indexes():
+    n_features = 5
+    hyps = create_line_hyp_space(n_features)
+
+    # hypothesis spaces are created once per type and number of features
+    hyp_space = get_hyp_space("line", n_features)
+    assert get_hyp_space("line", n_features) is hyp_space
+
+    for backend in ["dense", "bitset", "implicit"]:
+        hyp_space = get_hyp_space("line", n_features, backend)
+
+        assert hyp_space.index(hyps[7]) == 7
+        assert np.array_equal(hyp_space.label_rows(2, 1),
+                              np.flatnonzero(hyps[:, 2] == 1))
+        assert np.array_equal(hyp_space.label_rows(2, 0),
+                              np.flatnonzero(hyps[:, 2] == 0))
+
+    # models accept a hypothesis space directly
+    for model in [ConceptTeacher, ConceptSelfTeacher, ConceptActiveLearner]:
+        learner = model(hyp_space=hyp_space, true_hyp=hyps[7])
+        assert learner.hyp_space is hyp_space
+        assert learner.n_features == n_features
+        assert learner.true_hyp_idx == 7
+
+        # which must agree with the number of features and type if given
+        assert model(n_features, "line", hyp_space=hyp_space).hyp_space \
+            is hyp_space
+        with pytest.raises(ValueError):
+            model(n_features + 1, hyp_space=hyp_space)
+        with pytest.raises(ValueError):
+            model(hyp_space_type="boundary", hyp_space=hyp_space)
+
+
+def test_concept_likelihood():
+    n_features = 4
+    hyps = create_line_hyp_space(n_features)
+
+    teacher = ConceptTeacher(n_features, "line")
+    self_teacher = ConceptSelfTeacher(n_features, "line")
+    lik = teacher.likelihood()
+
+    # built once per hypothesis space and shared read-only
+    assert lik is self_teacher.likelihood()
+    assert not lik.flags.writeable
+
+    for i, hyp in enumerate(hyps):
+        for x in range(n_features):
+            for y in range(2):
+                assert lik[i, x, y] == (hyp[x] == y)
+
+
+def test_bitset_hyp_space():
+    # 70 features spans two 64-bit words
+    n_features = 70
+
+    for hyp_space_type in ["boundary", "line"]:
+        hyp_space = create_hyp_space(hyp_space_type, n_features)
+        bitset_hyp_space = create_hyp_space(
+            hyp_space_type, n_features, backend="bitset")
+
+        assert np.array_equal(np.asarray(bitset_hyp_space), hyp_space)
+        assert np.array_equal(bitset_hyp_space[:, 64], hyp_space[:, 64])
+        assert np.array_equal(popcount(bitset_hyp_space.words),
+                              np.sum(hyp_space, axis=1))
+
+        features = np.array([3, 40, 65])
+        labels = hyp_space[len(hyp_space) // 2, features]
+        consistent = np.all(hyp_space[:, features] == labels, axis=1)
+
+        assert np.array_equal(bitset_hyp_space.consistent(features, labels),
+                              consistent)
+        assert bitset_hyp_space.version_space_size(features, labels) == \
+            np.sum(consistent)
+
+        # weighted sums over packed words match the dense likelihood
+        weights = np.random.rand(len(hyp_space))
+        values = np.random.rand(n_features)
+        rows = np.arange(0, len(hyp_space), 3)
+        for y in range(2):
+            lik = (hyp_space == y).astype(float)
+            assert np.allclose(
+                bitset_hyp_space.weighted_column_sums(weights, y),
+                weights @ lik)
+            assert np.allclose(
+                bitset_hyp_space.weighted_column_sums(weights[rows], y, rows),
+                weights[rows] @ lik[rows])
+            assert np.allclose(
+                bitset_hyp_space.weighted_row_sums(values, y, rows),
+                lik[rows] @ values)
+
+        posterior = bitset_hyp_space.mask_posterior(
+            weights[rows], features, labels, rows)
+        assert np.allclose(posterior, weights[rows] * consistent[rows] /
+                           np.sum(weights[rows] * consistent[rows]))
+
+
+def test_interval_sums():
+    np.random.seed(0)
+    n_features = 9
+
+    for hyp_space_type in ["boundary", "line"]:
+        hyp_space = get_hyp_space(hyp_space_type, n_features)
+        hyps = np.asarray(hyp_space)
+
+        # sparse weights check features that no weighted run covers
+        weights = np.random.rand(len(hyps))
+        weights[np.random.rand(len(hyps)) < 0.7] = 0
+        values = np.random.rand(n_features)
+        values[np.random.rand(n_features) < 0.5] = 0
+        rows = np.arange(1, len(hyps), 2)
+        for y in range(2):
+            lik = (hyps == y).astype(float)
+            assert np.allclose(hyp_space.weighted_column_sums(weights, y),
+                               weights @ lik)
+            assert np.allclose(
+                hyp_space.weighted_column_sums(weights[rows], y, rows),
+                weights[rows] @ lik[rows])
+            assert np.allclose(hyp_space.weighted_row_sums(values, y, rows),
+                               lik[rows] @ values)
+
+        assert np.array_equal(hyp_space.weighted_column_sums(weights, 1) == 0,
+                              weights @ hyps == 0)
+
+
+def test_bitset_models_stay_packed():
+    n_features = 70
+    hyps = create_hyp_space("line", n_features)
+    hyp_space = get_hyp_space("line", n_features, "bitset")
+    assert not hyp_space.dense_sums
+
+    for model in [ConceptActiveLearner, ConceptSelfTeacher]:
+        np.random.seed(0)
+        dense_results = model(n_features, "line", true_hyp=hyps[100]).run()
+        np.random.seed(0)
+        results = model(hyp_space=hyp_space, true_hyp=hyps[100]).run()
+
+        assert results[0] == dense_results[0]
+        assert np.allclose(results[1], dense_results[1])
+        assert np.allclose(results[2], dense_results[2])
+
+    # the dense likelihood tensor is never built
+    assert hyp_space.lik is None
+
+
+def test_concept_self_teacher_bitset():
+    n_features = 3
+    hyp_space_type = "boundary"
+    sampling = "max"
+
+    self_teacher = ConceptSelfTeacher(
+        n_features, hyp_space_type, sampling=sampling, backend="bitset")
+    self_teacher.update_learner_posterior()
+    self_teacher.update_self_teaching_posterior()
+
+    first_feature_prob = np.array([50/154, 54/154, 50/154])
+
+    assert np.allclose(first_feature_prob,
+                       self_teacher.self_teaching_posterior[0, :, 0])
+
+
+def test_batch_expected_information_gain():
+    n_features = 6
+
+    for hyp_space_type in ["boundary", "line"]:
+        active_learner = ConceptActiveLearner(n_features, hyp_space_type)
+
+        for x in [2, 4]:
+            eig = np.array([active_learner.expected_information_gain(query)
+                            for query in range(n_features)])
+            assert np.allclose(
+                eig, active_learner.batch_expected_information_gain())
+
+            active_learner.update(x, active_learner.true_hyp[x])
+
+
+def test_boundary_closed_form():
+    n_features = 7
+    hyps = create_boundary_hyp_space(n_features)
+
+    # untyped hypothesis spaces take the dense path
+    boundary_hyp_space = get_hyp_space("boundary", n_features)
+    dense_hyp_space = HypothesisSpace(hyps.copy())
+
+    active_learner = ConceptActiveLearner(hyp_space=boundary_hyp_space)
+    dense_active_learner = ConceptActiveLearner(hyp_space=dense_hyp_space)
+    self_teacher = ConceptSelfTeacher(hyp_space=boundary_hyp_space)
+
+    posterior = self_teacher.learner_prior[:, 0, 0]
+    for x, y in [(3, 1), (5, 0)]:
+        # dense self-teaching posterior given the current posterior
+        self_teacher.learner_posterior = np.broadcast_to(
+            posterior[:, None, None], self_teacher.learner_prior.shape)
+        self_teacher.update_learner_posterior()
+        self_teacher.update_self_teaching_posterior()
+
+        assert np.allclose(
+            self_teacher.closed_form_self_teaching_posterior(posterior),
+            self_teacher.self_teaching_posterior[0, :, 0])
+        assert np.allclose(
+            active_learner.batch_expected_information_gain(),
+            dense_active_learner.batch_expected_information_gain())
+
+        posterior = posterior * (hyps[:, x] == y)
+        posterior = posterior / np.sum(posterior)
+        active_learner.update(x, y)
+        dense_active_learner.update(x, y)
+
+
+def test_version_space():
+    np.random.seed(0)
+    n_features = 8
+
+    for hyp_space_type in ["boundary", "line"]:
+        hyp_space = get_hyp_space(hyp_space_type, n_features)
+        hyps = np.asarray(hyp_space)
+
+        for _ in range(20):
+            version_space = VersionSpace(hyp_space)
+            mask = np.ones(len(hyps), dtype=bool)
+
+            true_hyp = hyps[np.random.randint(len(hyps))]
+            for x in np.random.permutation(n_features):
+                version_space.observe(x, true_hyp[x])
+                mask &= hyps[:, x] == true_hyp[x]
+
+                assert version_space.size() == np.sum(mask)
+                assert np.array_equal(version_space.consistent(), mask)
+
+
+def test_concept_teacher_run():
+    np.random.seed(0)
+    n_features = 6
+
+    for hyp_space_type in ["boundary", "line"]:
+        for true_hyp in get_hyp_space(hyp_space_type, n_features):
+            teacher = ConceptTeacher(n_features, hyp_space_type,
+                                     true_hyp=true_hyp)
+            n_obs, posterior_true_hyp = teacher.run()[:2]
+
+            # the run stops once the learner is certain of the true hypothesis
+            assert np.isclose(posterior_true_hyp[n_obs], 1.0)
+
+
+def test_active_set():
+    n_features = 6
+
+    for model in [ConceptTeacher, ConceptSelfTeacher, ConceptActiveLearner]:
+        for hyp_space_type in ["boundary", "line"]:
+            for true_hyp in get_hyp_space(hyp_space_type, n_features):
+                # compacted runs make the same choices as full runs
+                results = []
+                for active_set in [False, True]:
+                    np.random.seed(0)
+                    learner = model(n_features, hyp_space_type,
+                                    true_hyp=true_hyp, active_set=active_set)
+                    results.append(learner.run())
+
+                for full, compacted in zip(*results):
+                    assert np.allclose(full, compacted)
+
+                # active rows map back to hypotheses that are still
+                # consistent with the observations
+                assert learner.n_active < learner.n_hyp
+                assert learner.true_hyp_idx in learner.active_hyps
+
+
+def test_posterior_views():
+    np.random.seed(0)
+    n_features = 5
+
+    teacher = ConceptTeacher(n_features, "line")
+    teacher.run_ci()
+    self_teacher = ConceptSelfTeacher(n_features, "line")
+    self_teacher.update_learner_posterior()
+    self_teacher.update_self_teaching_posterior()
+
+    # posteriors shared across labels are read-only broadcast views
+    for posterior in [teacher.teacher_posterior,
+                      self_teacher.self_teaching_posterior]:
+        assert not posterior.flags.writeable
+        assert np.array_equal(posterior[:, :, 0], posterior[:, :, 1])
+    assert np.allclose(self_teacher.self_teaching_posterior[0],
+                       self_teacher.self_teaching_posterior[-1])
+
+    # sampling copies the posterior before removing observed features
+    teacher_posterior = teacher.teacher_posterior.copy()
+    teacher.observed_features = np.array([0, 1])
+    teacher.sample_teacher_posterior()
+    assert np.array_equal(teacher.teacher_posterior, teacher_posterior)
+
+
+def test_log_domain_teacher():
+    n_features = 8
+
+    for hyp_space_type in ["boundary", "line"]:
+        for true_hyp in get_hyp_space(hyp_space_type, n_features):
+            results = []
+            for dtype in [None, np.float64, np.float32]:
+                np.random.seed(0)
+                if dtype is None:
+                    teacher = ConceptTeacher(n_features, hyp_space_type,
+                                             true_hyp=true_hyp)
+                else:
+                    teacher = ConceptTeacher(n_features, hyp_space_type,
+                                             true_hyp=true_hyp,
+                                             log_domain=True, dtype=dtype)
+                results.append(teacher.run())
+
+            # log space runs make the same choices, up to float32 precision
+            for result in results[1:]:
+                assert result[0] == results[0][0]
+                assert np.allclose(result[1], results[0][1], atol=1e-3)
+                assert np.allclose(result[2], results[0][2], atol=1e-5)
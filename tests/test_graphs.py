@@ -1,9 +1,18 @@
+import os
+import pickle
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from models import utils
+from models import fixed_point
+from models import graph_likelihood
+from models import pedagogical_sampling
 from models.dag import DirectedGraph
+from models.intervention_index import InterventionIndex
 from models.graph_teacher import GraphTeacher
 from models.graph_active_learner import GraphActiveLearner
+from models.graph_problem_set import GraphProblemSet
+from models.graph_self_teacher import GraphSelfTeacher
 from models.graph_positive_test_strategy import GraphPositiveTestStrategy
 
 
@@ -72,17 +81,14 @@ def test_intervene():
     common_effect_intervene_1 = np.array([[0, 0, 1], [0, 0, 1], [0, 0, 0]])
     common_effect_intervene_2 = np.array([[0, 0, 0], [0, 0, 0], [0, 0, 0]])
 
-    common_effect_1.intervene(0)
     assert np.array_equal(
-        common_effect_1.intervened_graph, common_effect_intervene_0)
+        common_effect_1.intervene(0), common_effect_intervene_0)
 
-    common_effect_1.intervene(1)
     assert np.array_equal(
-        common_effect_1.intervened_graph, common_effect_intervene_1)
+        common_effect_1.intervene(1), common_effect_intervene_1)
 
-    common_effect_1.intervene(2)
     assert np.array_equal(
-        common_effect_1.intervened_graph, common_effect_intervene_2)
+        common_effect_1.intervene(2), common_effect_intervene_2)
 
     causal_chain_1 = hyp_space["causal_chain_1"]
 
@@ -90,17 +96,60 @@ def test_intervene():
     causal_chain_intervene_1 = np.array([[0, 0, 0], [0, 0, 1], [0, 0, 0]])
     causal_chain_intervene_2 = np.array([[0, 1, 0], [0, 0, 0], [0, 0, 0]])
 
-    causal_chain_1.intervene(0)
     assert np.array_equal(
-        causal_chain_1.intervened_graph, causal_chain_intervene_0)
+        causal_chain_1.intervene(0), causal_chain_intervene_0)
 
-    causal_chain_1.intervene(1)
     assert np.array_equal(
-        causal_chain_1.intervened_graph, causal_chain_intervene_1)
+        causal_chain_1.intervene(1), causal_chain_intervene_1)
 
-    causal_chain_1.intervene(2)
     assert np.array_equal(
-        causal_chain_1.intervened_graph, causal_chain_intervene_2)
+        causal_chain_1.intervene(2), causal_chain_intervene_2)
+
+
+def test_immutable_graph():
+    hyp_space = utils.create_graph_hyp_space(t=0.8, b=0.01)
+    graph = hyp_space["common_effect_1"]
+
+    assert graph.parents == ((), (), (0, 1))
+    assert graph.intervened_parents[2] == ((), (), ())
+
+    with pytest.raises(AttributeError):
+        graph.t = 0.5
+    with pytest.raises(ValueError):
+        graph.graph[0, 1] = 1
+    with pytest.raises(ValueError):
+        graph.intervene(2)[0, 2] = 1
+
+    copy = pickle.loads(pickle.dumps(graph))
+    assert np.array_equal(copy.graph, graph.graph)
+
+    # graphs are shared between threads without copies
+    graphs = list(hyp_space.values())
+    pairs = [(graph, observation) for graph in graphs
+             for observation in graph.observations]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        lik = list(executor.map(
+            lambda pair: pair[0].observation_likelihood(pair[1]), pairs))
+
+    assert np.allclose(np.reshape(lik, (len(graphs), -1)),
+                       graph_likelihood.likelihood(graphs))
+
+
+def test_threaded_cached_likelihood(monkeypatch):
+    # a cache smaller than the graphs, so threads evict each other's rows
+    cache = graph_likelihood.LikelihoodCache(maxsize=4, symmetric=True)
+    monkeypatch.setattr(graph_likelihood, "likelihood_cache", cache)
+
+    graphs = [graph for t in [0.6, 0.7, 0.8, 0.9]
+              for graph in utils.create_teaching_hyp_space(t=t, b=0.01)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        lik = list(executor.map(lambda graph: graph.likelihood(),
+                                graphs * 20))
+
+    assert np.allclose(lik, np.tile(graph_likelihood.likelihood(graphs),
+                                    (20, 1)))
+    assert cache.hits + cache.misses == len(graphs) * 20
+    assert len(cache.rows) == 4
 
 
 def test_likelihood():
@@ -166,6 +215,383 @@ def test_causal_graph_simulation():
 
     assert np.all(np.isclose(teach_true, teach))
 
+    # the kinds of graphs are the orbits of relabelled graphs
+    assert np.allclose(teach, graph_teacher.teacher_likelihood(
+        graph_teacher.teacher_posterior,
+        graph_teacher.sequential_teacher_posterior, graph_kinds=[0, 3, 6]))
+
+
+def test_sequential_teacher_likelihood():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.0)
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+    graph_teacher.update_learner_posterior()
+
+    n_obs = graph_teacher.n_observations
+    teach = graph_teacher.sequential_teacher_likelihood(3)
+    assert [t.shape for t in teach] == [(n_obs, 12), (n_obs, n_obs, 12),
+                                        (n_obs, n_obs, n_obs, 12)]
+
+    # every graph teaches some sequence of each length
+    for t in teach:
+        assert np.allclose(np.sum(t.reshape(-1, graph_teacher.n_hyp),
+                                  axis=0), 1.0)
+
+    # the first step is the teacher posterior
+    assert np.allclose(teach[0], graph_teacher.teacher_posterior *
+                       graph_teacher.lik)
+
+    # the second step teaches the learner posterior after the first
+    prior = np.zeros((n_obs, graph_teacher.n_hyp))
+    prior[:] = graph_teacher.learner_posterior[5]
+    intervention_posterior = graph_teacher.cooperative_inference(
+        graph_teacher.create_cooperative_inference()
+        .initial_teacher_posterior(prior), prior)
+    teacher_posterior = graph_teacher.expand(intervention_posterior)
+    assert np.allclose(teach[1][5], teach[0][5] * teacher_posterior *
+                       graph_teacher.lik, atol=1e-6)
+
+    # histories leading to the same learner posterior share a state, which
+    # later calls reuse
+    n_states = len(graph_teacher.sequential_states)
+    assert n_states < 1 + n_obs + n_obs ** 2
+    graph_teacher.history_likelihood([[0, 4, 6], [6, 4, 0]])
+    assert len(graph_teacher.sequential_states) == n_states
+
+
+def test_intervention_posterior():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+    graph_teacher.update_learner_posterior()
+
+    # grouped sums over the observations of each intervention
+    order, starts = utils.create_segment_index(graph_teacher.interventions)
+    sums = utils.segment_sum(graph_teacher.lik, order, starts)
+    for i in range(graph_teacher.n_interventions):
+        assert np.allclose(sums[i], np.sum(
+            graph_teacher.lik[graph_teacher.interventions == i], axis=0))
+
+    # every observation of an intervention shares its teacher posterior,
+    # which is normalized over interventions
+    intervention_posterior = graph_teacher.intervention_posterior
+    assert intervention_posterior.shape == (graph_teacher.n_interventions,
+                                            graph_teacher.n_hyp)
+    assert np.allclose(np.sum(intervention_posterior, axis=0), 1.0)
+    assert np.array_equal(
+        graph_teacher.teacher_posterior,
+        intervention_posterior[graph_teacher.interventions])
+
+
+def test_fixed_point_solvers():
+    def g(x):
+        return 0.9 * x + 0.2
+
+    # slowly contracting map with fixed point 2, which both accelerated
+    # solvers reach in fewer iterations
+    n_iters = {}
+    for method in fixed_point.solvers:
+        x, trace = fixed_point.solve(g, np.array([0.0, 1.0]), method=method,
+                                     tol=1e-10)
+        assert np.allclose(x, 2.0)
+        assert trace[-1] <= 1e-10
+        n_iters[method] = len(trace)
+
+    assert n_iters["over_relaxation"] < n_iters["picard"]
+    assert n_iters["anderson"] < n_iters["over_relaxation"]
+
+    # iteration budget is respected
+    x, trace = fixed_point.solve(g, np.array([0.0]), tol=1e-10, max_iter=5)
+    assert len(trace) == 5 and trace[-1] > 1e-10
+
+    with pytest.raises(ValueError):
+        fixed_point.solve(g, np.array([0.0]), method="newton")
+
+
+def test_cooperative_inference_solvers():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+
+    teacher_posteriors = []
+    n_iters = []
+    for method in ["picard", "anderson"]:
+        graph_teacher = GraphTeacher(graphs, ci_method=method)
+        graph_teacher.likelihood()
+        graph_teacher.update_learner_posterior()
+        graph_teacher.update_sequential_teacher_posterior()
+        teacher_posteriors.append(
+            graph_teacher.sequential_teacher_posterior)
+        n_iters.append(len(graph_teacher.ci_trace))
+
+    assert np.allclose(teacher_posteriors[0], teacher_posteriors[1],
+                       atol=1e-5)
+    assert n_iters[1] < n_iters[0]
+
+
+def test_log_domain_cooperative_inference():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.0)
+
+    teach = []
+    for log_domain, dtype in [(False, np.float64), (True, np.float64),
+                              (True, np.float32)]:
+        graph_teacher = GraphTeacher(graphs, log_domain=log_domain,
+                                     dtype=dtype)
+        graph_teacher.likelihood()
+        graph_teacher.update_learner_posterior()
+        graph_teacher.update_sequential_teacher_posterior()
+        teach.append(graph_teacher.teacher_likelihood(
+            graph_teacher.teacher_posterior,
+            graph_teacher.sequential_teacher_posterior))
+
+    assert np.allclose(teach[0], teach[1])
+    assert np.allclose(teach[0], teach[2], atol=1e-6)
+
+
+def test_log_domain_iterate():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+
+    # start from a teacher that almost never chooses the last intervention,
+    # which underflows float32 probabilities but not log probabilities
+    start = np.ones((graph_teacher.n_interventions, graph_teacher.n_hyp))
+    start[-1] = 1e-60
+    start = start / np.sum(start, axis=0)
+
+    for method in fixed_point.solvers:
+        teacher_posteriors = []
+        for log_domain, dtype in [(False, np.float64), (True, np.float32)]:
+            graph_teacher.ci_method = method
+            graph_teacher.log_domain = log_domain
+            graph_teacher.dtype = dtype
+            teacher_posteriors.append(graph_teacher.cooperative_inference(
+                start, graph_teacher.learner_prior))
+
+        assert np.allclose(teacher_posteriors[0], teacher_posteriors[1],
+                           atol=1e-5)
+
+
+def test_batch_cooperative_inference():
+    np.random.seed(0)
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+
+    # grid of learner priors over graphs, shared by all observations
+    priors = np.random.dirichlet(np.ones(graph_teacher.n_hyp), size=20)
+    priors = np.repeat(priors[:, None], graph_teacher.n_observations, axis=1)
+
+    for method in ["picard", "anderson"]:
+        graph_teacher.ci_method = method
+        teacher_posterior = graph_teacher.update_teacher_posterior(priors)
+        trace = graph_teacher.ci_trace
+
+        for prior, batch_teacher_posterior in zip(priors, teacher_posterior):
+            assert np.allclose(graph_teacher.update_teacher_posterior(prior),
+                               batch_teacher_posterior)
+
+        # elements are masked out once they converge
+        assert trace.shape[1] == len(priors)
+        n_iters = np.sum(~np.isnan(trace), axis=0)
+        assert np.all(trace[n_iters - 1, np.arange(len(priors))] <= 1e-5)
+
+
+def test_causal_ped_sampling():
+    io = pytest.importorskip("scipy.io")
+    preds = io.loadmat(os.path.join(
+        os.path.dirname(__file__), "..", "old_models",
+        "causal_learning_matlab", "causalPreds2.mat"))
+
+    # order graphs as in the saved bayes nets, which were built with t = 0.8
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    edges = np.zeros((len(graphs), 3, 3), dtype=int)
+    for i, bnet in enumerate(preds["bnet"][0]):
+        for node, cpd in enumerate(bnet["node"][0, 0][0]):
+            edges[i, cpd[0, 0]["parents"].ravel() - 1, node] = 1
+    graphs = [next(graph for graph in graphs
+                   if np.array_equal(graph.graph, edge)) for edge in edges]
+
+    observations = preds["examples"][:, 3:].astype(int)
+    interventions = pedagogical_sampling.intervention_groups(observations)
+    lik = pedagogical_sampling.likelihood(graphs, observations)
+    assert np.array_equal(interventions, [0, 0, 0, 0, 1, 1, 2, 2, 1, 1, 2, 2])
+
+    teacher_posterior, learner_posterior = \
+        pedagogical_sampling.causal_ped_sampling(
+            preds["prior"][0, 0].ravel(), lik, interventions)
+    assert np.allclose(teacher_posterior, preds["likelihoods"][0, 0])
+    assert np.allclose(learner_posterior, preds["posterior"][0, 0])
+
+    # the priors after each intervention run as a batch
+    priors = np.concatenate(preds["prior2"][0])
+    teacher_posterior, learner_posterior = \
+        pedagogical_sampling.causal_ped_sampling(priors, lik, interventions)
+    assert np.allclose(teacher_posterior, np.stack(preds["like2"][0]))
+    assert np.allclose(learner_posterior, np.stack(preds["post2"][0]))
+
+
+def test_like_ped_sampling():
+    np.random.seed(0)
+    lik = np.random.rand(8, 5)
+    priors = np.random.dirichlet(np.ones(5), size=3)
+
+    for rho in [1.0, 2.0]:
+        batch = pedagogical_sampling.like_ped_sampling(priors, lik, rho=rho)
+
+        for prior, batch_lik in zip(priors, batch):
+            # iterate as in likePedSampling.m
+            m = lik
+            m_prev = np.ones_like(lik)
+            while np.sum(np.absolute(m_prev - m)) > 0.00001:
+                m_prev = m
+                m = prior * m / np.sum(prior * m, axis=1, keepdims=True)
+                m = m ** rho / np.sum(m ** rho, axis=0)
+
+            assert np.allclose(batch_lik, m, atol=1e-5)
+            assert np.allclose(np.sum(batch_lik, axis=0), 1.0)
+
+
+def test_enumerate_dags():
+    # number of labelled, unlabelled and weakly connected dags
+    for n_nodes, n_dags in enumerate([1, 1, 3, 25, 543]):
+        dags = list(utils.enumerate_dags(n_nodes))
+        assert len(dags) == n_dags
+        assert len(set(graph.tobytes() for graph in dags)) == n_dags
+
+    assert len(list(utils.enumerate_dags(4, unlabelled=True))) == 31
+    assert len(list(utils.enumerate_dags(4, connected=True))) == 446
+
+    # parent sets of size at most one make forests
+    assert len(list(utils.enumerate_dags(3, max_parents=1))) == 16
+
+    # the hand written graphs are all three node dags with one or two edges
+    t = 0.8
+    b = 0.01
+    hyp_space = utils.create_graph_hyp_space(t, b)
+    graphs = [graph for graph in utils.create_dag_hyp_space(3, t, b)
+              if 1 <= np.sum(graph.graph) <= 2]
+    assert len(graphs) == len(hyp_space)
+    for graph in hyp_space.values():
+        assert any(np.array_equal(graph.graph, other.graph) and
+                   np.allclose(graph.likelihood(), other.likelihood())
+                   for other in graphs)
+
+    # noisy-or with two parents
+    cpd = utils.noisy_or_cpd(2, t, b)
+    assert cpd.shape == (2, 2, 2)
+    assert np.isclose(cpd[1, 1, 1], t ** 2 + 2 * t * (1 - t) + b * (1 - t) ** 2)
+    assert np.allclose(np.sum(cpd, axis=-1), 1.0)
+
+
+def test_intervention_index():
+    index = InterventionIndex(3)
+
+    observations = np.array([[0, 1, 1], [0, 1, 2],
+                             [0, 2, 1], [0, 2, 2],
+                             [1, 0, 1], [1, 0, 2],
+                             [1, 1, 0], [1, 2, 0],
+                             [2, 0, 1], [2, 0, 2],
+                             [2, 1, 0], [2, 2, 0]])
+    assert np.array_equal(index.observations, observations)
+    assert np.array_equal(index.interventions,
+                          [0, 0, 0, 0, 1, 1, 2, 2, 1, 1, 2, 2])
+    assert np.array_equal(index.unique_interventions, [3, 9, 11])
+    assert np.array_equal(index.first_interventions, [0, 4, 6])
+    assert np.array_equal(index.index(observations), np.arange(12))
+    assert index.intervention([2, 1, 0]) == 2
+
+    # exactly one intervened node, and every off/on state of the others
+    index = InterventionIndex(5)
+    assert len(index) == 5 * 2 ** 4
+    assert np.all(np.sum(index.observations == 0, axis=1) == 1)
+    assert np.all(np.diff(index.codes) > 0)
+    assert np.array_equal(index.intervention_counts, [2 ** 4] * 5)
+
+    # graph models scale past three nodes
+    graphs = list(utils.create_dag_hyp_space(4, connected=True))[:10]
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+    graph_teacher.update_learner_posterior()
+    assert graph_teacher.lik.shape == (32, 10)
+    assert np.allclose(np.sum(graph_teacher.intervention_posterior, axis=0),
+                       1.0)
+
+
+def test_batch_graph_likelihood():
+    # matches scoring one observation at a time
+    for graphs in [list(utils.create_graph_hyp_space().values()),
+                   list(utils.create_dag_hyp_space(4, t=0.7, b=0.05))]:
+        lik = graph_likelihood.likelihood(graphs)
+        for graph, graph_lik in zip(graphs, lik):
+            assert np.allclose(graph_lik, [
+                graph.observation_likelihood(observation)
+                for observation in graph.observations])
+
+        # every intervention is a distribution over outcomes
+        assert lik.shape == (len(graphs), len(graphs[0].observations))
+        assert np.allclose(np.sum(lik, axis=1), graphs[0].n_nodes)
+
+
+def test_likelihood_cache():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    cache = graph_likelihood.LikelihoodCache(maxsize=15)
+
+    lik = cache.likelihood(graphs)
+    assert (cache.hits, cache.misses) == (0, 12)
+    assert np.array_equal(lik, graph_likelihood.likelihood(graphs))
+
+    # rebuilt graphs with the same structure and parameters are hits
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    assert np.array_equal(cache.likelihood(graphs), lik)
+    assert (cache.hits, cache.misses) == (12, 12)
+
+    # other parameters are new rows, evicting the least recently used
+    cache.likelihood(utils.create_teaching_hyp_space(t=0.9, b=0.01))
+    assert (cache.hits, cache.misses) == (12, 24)
+    assert len(cache.rows) == 15
+    assert cache.key(graphs[0]) not in cache.rows
+    assert cache.key(graphs[-1]) in cache.rows
+
+    # graphs with the same structure and parameters but other tables are
+    # new rows
+    graph = graphs[0]
+    cpds = [np.full(np.shape(cpd), 0.5) for cpd in graph.cpds]
+    other = DirectedGraph(graph.graph, cpds, t=graph.t, b=graph.b)
+    assert cache.key(other) != cache.key(graph)
+    assert np.allclose(cache.likelihood([other]),
+                       graph_likelihood.likelihood([other]))
+    assert np.allclose(other.likelihood(),
+                       [other.observation_likelihood(obs)
+                        for obs in other.observations])
+
+
+def test_symmetric_likelihood():
+    graphs = list(utils.create_graph_hyp_space(t=0.8, b=0.01).values())
+
+    # common causes, common effects, chains and single links
+    orbit, _ = graph_likelihood.orbits(graphs)
+    assert np.array_equal(np.unique(orbit), [0, 3, 6, 12])
+
+    for graphs in [graphs, list(utils.create_dag_hyp_space(4))]:
+        assert np.allclose(graph_likelihood.symmetric_likelihood(graphs),
+                           graph_likelihood.likelihood(graphs))
+
+    # graphs with other parameters are in their own orbits
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)[:3] + \
+        utils.create_teaching_hyp_space(t=0.9, b=0.01)[:3]
+    orbit, _ = graph_likelihood.orbits(graphs)
+    assert np.array_equal(orbit, [0, 0, 0, 3, 3, 3])
+
+    # as are graphs with tables that are not noisy-OR
+    np.random.seed(0)
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)[:3]
+    graphs.append(DirectedGraph(graphs[1].graph, [
+        np.random.dirichlet([1, 1], np.shape(cpd)[:-1])
+        for cpd in graphs[1].cpds], t=0.8, b=0.01))
+    orbit, _ = graph_likelihood.orbits(graphs)
+    assert np.array_equal(orbit, [0, 0, 0, 3])
+    assert np.allclose(graph_likelihood.symmetric_likelihood(graphs),
+                       graph_likelihood.likelihood(graphs))
+
 
 def test_graph_active_learner_one():
     t = 0.8  # transmission rate
@@ -251,3 +677,82 @@ def test_graph_positive_test_strategy():
     graph_pts_four = GraphPositiveTestStrategy(active_learning_problem_four)
     assert np.all(np.isclose(graph_pts_four.positive_test_strategy(),
                              active_learning_problem_four_probs))
+
+
+def test_descendant_links():
+    # diamond 0 -> 1, 0 -> 2, 1 -> 3, 2 -> 3 has two paths from 0 to 3
+    diamond = np.array([[0, 1, 1, 0],
+                        [0, 0, 0, 1],
+                        [0, 0, 0, 1],
+                        [0, 0, 0, 0]])
+    chain = np.eye(4, k=1, dtype=int)
+    diamond, chain = [DirectedGraph(graph, utils.create_noisy_or_cpds(
+        graph, 0.8, 0.0), t=0.8, b=0.0) for graph in [diamond, chain]]
+    gpts = GraphPositiveTestStrategy([diamond, chain])
+
+    assert [gpts.descendant_links(diamond, action)
+            for action in gpts.actions] == [3, 1, 1, 0]
+    assert np.array_equal(np.sum(gpts.descendants(), axis=-1),
+                          [[3, 1, 1, 0], [3, 2, 1, 0]])
+    assert np.allclose(gpts.link_scores(),
+                       [[3/4, 1/4, 1/4, 0], [1, 2/3, 1/3, 0]])
+
+    # the empty graph scores zero, rather than dividing by zero links
+    graphs = list(utils.create_dag_hyp_space(3, t=0.8, b=0.0))
+    gpts = GraphPositiveTestStrategy(graphs)
+    link_scores = gpts.link_scores()
+    assert np.array_equal(link_scores[0], [0, 0, 0])
+    assert np.all(np.isfinite(gpts.positive_test_strategy()))
+    pts = GraphProblemSet.from_subsets(graphs).positive_test_strategy()
+    assert np.all(np.isfinite(pts))
+    assert np.allclose(np.sum(pts, axis=1), 1.0)
+
+    # the batch matches the descendants of each graph
+    graphs = list(utils.create_dag_hyp_space(4, t=0.8, b=0.0))
+    gpts = GraphPositiveTestStrategy(graphs)
+    descendants = np.sum(gpts.descendants(), axis=-1)
+    for graph, row in zip(graphs, descendants):
+        assert np.array_equal(row, [gpts.descendant_links(graph, action)
+                                    for action in gpts.actions])
+
+
+def test_graph_problem_set():
+    active_learning_problems = utils.create_active_learning_hyp_space(
+        t=0.8, b=0.0)
+    problem_set = GraphProblemSet.from_problems(active_learning_problems)
+    assert problem_set.problems.shape == (27, 2)
+    assert problem_set.lik.shape == (problem_set.n_graphs, 12)
+
+    # graphs are only shared between problems if their tables match
+    graph = active_learning_problems[0][0]
+    cpds = [np.full(np.shape(cpd), 0.5) for cpd in graph.cpds]
+    other = DirectedGraph(graph.graph, cpds, t=graph.t, b=graph.b)
+    other_set = GraphProblemSet.from_problems(
+        [active_learning_problems[0], [other, graph]])
+    assert np.array_equal(other_set.problems, [[0, 1], [2, 0]])
+    assert np.allclose(other_set.lik[2], graph_likelihood.likelihood([other]))
+
+    eig = problem_set.expected_information_gain()
+    self_teaching_posterior = problem_set.self_teaching_posterior()
+    pts = problem_set.positive_test_strategy()
+
+    # matches running the models on each problem
+    for i, problem in enumerate(active_learning_problems):
+        gal = GraphActiveLearner(problem)
+        gal.update_posterior()
+        assert np.allclose(eig[i], gal.expected_information_gain())
+
+        gst = GraphSelfTeacher(problem)
+        gst.update_learner_posterior()
+        assert np.allclose(self_teaching_posterior[i],
+                           gst.update_self_teaching_posterior())
+
+        gpts = GraphPositiveTestStrategy(problem)
+        assert np.allclose(pts[i], gpts.positive_test_strategy())
+
+    # every subset of three graphs
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    problem_set = GraphProblemSet.from_subsets(graphs, k=3)
+    assert problem_set.problems.shape == (220, 3)
+    assert np.allclose(np.sum(problem_set.self_teaching_posterior(), axis=1),
+                       1.0)
@@ -1 +1,117 @@
 import pytest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from models import utils
+from models.cooperative_inference import CooperativeInference
+from models.concept_teacher import ConceptTeacher
+from models.concept_teacher import CIResultCache
+from models.graph_teacher import GraphTeacher
+
+
+def test_concept_cooperative_inference():
+    n_features = 5
+
+    for hyp_space_type in ["boundary", "line"]:
+        teacher = ConceptTeacher(n_features, hyp_space_type)
+        ci_teacher = ConceptTeacher(n_features, hyp_space_type)
+
+        # the engine matches the dense learner and teacher updates
+        for i in range(5):
+            teacher.update_learner_posterior()
+            teacher.update_teacher_posterior()
+        ci_teacher.run_ci()
+
+        assert np.allclose(teacher.learner_posterior,
+                           ci_teacher.learner_posterior)
+        assert np.allclose(teacher.teacher_posterior,
+                           ci_teacher.teacher_posterior)
+        assert len(ci_teacher.ci_trace) == 5
+
+        # with a tolerance, iterations stop once the teacher converges
+        tol_teacher = ConceptTeacher(n_features, hyp_space_type, ci_tol=1e-6)
+        tol_teacher.run_ci(n_iters=1000)
+        assert tol_teacher.ci_trace[-1] <= 1e-6
+        assert len(tol_teacher.ci_trace) < 1000
+
+
+def test_graph_cooperative_inference():
+    graphs = utils.create_teaching_hyp_space(t=0.8, b=0.01)
+    graph_teacher = GraphTeacher(graphs)
+    graph_teacher.likelihood()
+    graph_teacher.update_learner_posterior()
+
+    ci = CooperativeInference(graph_teacher.lik, graph_teacher.interventions,
+                              likelihood_in_numerator=False,
+                              normalize_teacher_over_hyps=True)
+    teacher_posterior, learner_posterior = ci.run(
+        ci.initial_teacher_posterior(graph_teacher.learner_prior),
+        graph_teacher.learner_prior)
+
+    # teacher and learner posteriors are normalized over interventions and
+    # graphs, and match the graph teacher
+    assert np.allclose(np.sum(teacher_posterior, axis=0), 1.0)
+    assert np.allclose(np.sum(learner_posterior, axis=1), 1.0)
+    assert np.allclose(teacher_posterior,
+                       graph_teacher.intervention_posterior)
+    assert np.allclose(learner_posterior, graph_teacher.learner_posterior)
+    assert ci.trace[-1] <= ci.tol
+
+
+def test_ci_result_cache():
+    n_features = 6
+    ConceptTeacher.ci_cache.clear()
+
+    for hyp_space_type in ["boundary", "line"]:
+        for true_hyp in utils.get_hyp_space(hyp_space_type, n_features):
+            results = []
+            for cache_results in [False, True, True]:
+                np.random.seed(0)
+                teacher = ConceptTeacher(n_features, hyp_space_type,
+                                         true_hyp=true_hyp,
+                                         cache_results=cache_results)
+                results.append(teacher.run())
+
+            # cached runs make the same choices as full runs
+            for result in results[1:]:
+                for full, cached in zip(results[0], result):
+                    assert np.allclose(full, cached)
+
+            # a repeated run reuses every earlier cooperative inference run
+            assert teacher.ci_cache_misses == 0
+            assert teacher.ci_cache_hits == teacher.n_obs
+
+    # the cache keeps the most recently used results
+    assert len(ConceptTeacher.ci_cache) <= ConceptTeacher.ci_cache.maxsize
+    ConceptTeacher.ci_cache.clear()
+
+    ci_cache = CIResultCache(maxsize=2)
+    np.random.seed(0)
+    teacher = ConceptTeacher(n_features, "line",
+                             true_hyp=np.array([0, 1, 1, 1, 1, 0]),
+                             cache_results=True, ci_cache=ci_cache)
+    teacher.run()
+    assert teacher.ci_cache_misses == teacher.n_obs > 2
+    assert len(ci_cache) == 2
+    assert len(ConceptTeacher.ci_cache) == 0
+
+
+def test_threaded_ci_result_cache():
+    # a cache smaller than the runs, so threads evict each other's results
+    n_features = 6
+    ci_cache = CIResultCache(maxsize=4)
+    hyps = utils.get_hyp_space("line", n_features)
+
+    def run(true_hyp):
+        teacher = ConceptTeacher(n_features, "line", true_hyp=true_hyp,
+                                 cache_results=True, ci_cache=ci_cache)
+        n_obs, posterior_true_hyp = teacher.run()[:2]
+        return teacher, n_obs, posterior_true_hyp
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(run, list(hyps) * 5))
+
+    # every run still ends certain of the true hypothesis
+    for teacher, n_obs, posterior_true_hyp in results:
+        assert np.isclose(posterior_true_hyp[n_obs], 1.0)
+        assert teacher.ci_cache_hits + teacher.ci_cache_misses == n_obs
+    assert len(ci_cache) == 4